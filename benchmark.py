@@ -0,0 +1,531 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from importlib import metadata
+from typing import Any, Callable, Final, Iterable, Iterator
+
+import sqlalchemy
+from sqlalchemy import Connection, text
+
+from compiler import Compiler
+from conn_profiler import CommitScope
+from datalog import Program, Rule
+from delta_program import DELTA_PREFIX, OLD_PREFIX
+from plan_cache import PlanCache
+from scratch import ScratchMode
+from sinks import StatementRecord
+
+# Two sided 95% critical values of Student's t for 1 to 30 degrees of freedom
+T_95: Final[list[float]] = [
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+]  # fmt: skip
+Z_95: Final[float] = 1.96
+# Rows per multi-row INSERT while loading input facts
+BATCH_SIZE: Final[int] = 1000
+
+LOCAL_BACKENDS: Final[set[str]] = {"sqlite", "duckdb"}
+SERVER_DB_DATA: Final[dict[str, dict[str, Any]]] = {
+    "mysql": {
+        "user": os.getenv("MYSQL_USER", "root"),
+        "password": os.getenv("MYSQL_PASSWORD", "root"),
+        "host": os.getenv("MYSQL_HOST", "mysql"),
+        "db": os.getenv("MYSQL_DB", "mysql"),
+    },
+    "postgres": {
+        "user": os.getenv("POSTGRES_USER", "postgres"),
+        "password": os.getenv("POSTGRES_PASSWORD", "postgres"),
+        "host": os.getenv("POSTGRES_HOST", "localhost"),
+        "port": int(os.getenv("POSTGRES_PORT", "5432")),
+        "db": os.getenv("POSTGRES_DB", "postgres"),
+    },
+}
+
+
+def percentile(samples: list[int], q: float) -> float:
+    # Linear interpolation between closest ranks
+    ordered = sorted(samples)
+    pos = (len(ordered) - 1) * q
+    lower = math.floor(pos)
+    upper = math.ceil(pos)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (pos - lower)
+
+
+def summarize(samples: list[int]) -> dict[str, float]:
+    # Statistics of the poll times in ns, with a 95% confidence interval of
+    # the mean
+    n = len(samples)
+    mean = statistics.fmean(samples)
+    stddev = statistics.stdev(samples) if n > 1 else 0.0
+    critical = T_95[n - 2] if 1 < n <= len(T_95) + 1 else Z_95
+    margin = critical * stddev / math.sqrt(n)
+    return {
+        "n": n,
+        "min": min(samples),
+        "max": max(samples),
+        "mean": mean,
+        "median": statistics.median(samples),
+        "p95": percentile(samples, 0.95),
+        "stddev": stddev,
+        "ci95_low": mean - margin,
+        "ci95_high": mean + margin,
+    }
+
+
+def get_or_intern(mapping: dict[str, int], value: str):
+    if value not in mapping:
+        mapping[value] = len(mapping)
+    return mapping[value]
+
+
+def read_lines(input_path: str, scale: float) -> Iterator[str]:
+    # Streams the first scale fraction of the input lines
+    with open(input_path) as file:
+        total = sum(1 for _ in file)
+        file.seek(0)
+        yield from itertools.islice(file, math.ceil(total * scale))
+
+
+def distinct(rows: Iterable[tuple[int, ...]]) -> Iterator[tuple[int, ...]]:
+    seen: set[tuple[int, ...]] = set()
+    for row in rows:
+        if row not in seen:
+            seen.add(row)
+            yield row
+
+
+def bulk_insert(conn: Connection, table: str, rows: Iterable[tuple[int, ...]]) -> int:
+    # Postgres loads through COPY, other backends through multi-row INSERTs.
+    # Rows only hold ints, so they are safe to inline.
+    count = 0
+    if conn.dialect.driver == "psycopg":
+        with conn.connection.driver_connection.cursor() as cursor:
+            with cursor.copy(f"COPY {table} FROM STDIN") as copy:
+                for row in rows:
+                    copy.write_row(row)
+                    count += 1
+        return count
+    for batch in itertools.batched(rows, BATCH_SIZE):
+        values = ", ".join(f"({', '.join(map(str, row))})" for row in batch)
+        conn.execute(text(f"INSERT INTO {table} VALUES {values}"))
+        count += len(batch)
+    return count
+
+
+def create_edge_tables(conn: Connection):
+    init_queries = [
+        """CREATE TABLE E (
+            E_0 INTEGER,
+            E_1 INTEGER
+        )""",
+        """CREATE TABLE T (
+            T_0 INTEGER,
+            T_1 INTEGER
+        )""",
+    ]
+    for query in init_queries:
+        conn.execute(text(query))
+
+
+def setup_database(conn: Connection, input_path: str, scale: float) -> int:
+    create_edge_tables(conn)
+    rows = (tuple(map(int, line.split()[:2])) for line in read_lines(input_path, scale))
+    facts = bulk_insert(conn, "E", distinct(rows))
+    conn.commit()
+    return facts
+
+
+def setup_database_rdf(conn: Connection, input_path: str, scale: float) -> int:
+    init_queries = [
+        """
+        CREATE TABLE RDF (
+            RDF_0 INTEGER,
+            RDF_1 INTEGER,
+            RDF_2 INTEGER
+        )
+    """,
+        """
+        CREATE TABLE T (
+            T_0 INTEGER,
+            T_1 INTEGER,
+            T_2 INTEGER
+        )
+    """,
+    ]
+    for query in init_queries:
+        conn.execute(text(query))
+    mapping: dict[str, int] = {}
+    TYPE: Final[str] = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>"
+    SUB_CLASS_OF: Final[str] = "<http://www.w3.org/2000/01/rdf-schema#subClassOf>"
+    SUB_PROPERTY_OF: Final[str] = "<http://www.w3.org/2000/01/rdf-schema#subPropertyOf>"
+    DOMAIN: Final[str] = "<http://www.w3.org/2000/01/rdf-schema#domain>"
+    RANGE: Final[str] = "<http://www.w3.org/2000/01/rdf-schema#range>"
+    PROPERTY: Final[str] = "<http://www.w3.org/1999/02/22-rdf-syntax-ns#Property>"
+    PREFIX: Final[str] = "http://www.lehigh.edu/~zhp2/2004/0401/univ-bench.owl#"
+    get_or_intern(mapping, TYPE)
+    get_or_intern(mapping, SUB_CLASS_OF)
+    get_or_intern(mapping, SUB_PROPERTY_OF)
+    get_or_intern(mapping, DOMAIN)
+    get_or_intern(mapping, RANGE)
+    get_or_intern(mapping, PROPERTY)
+    get_or_intern(mapping, PREFIX)
+    rows = (
+        tuple(get_or_intern(mapping, term) for term in line.split()[:3])
+        for line in read_lines(input_path, scale)
+        if "genid" not in line
+    )
+    facts = bulk_insert(conn, "RDF", distinct(rows))
+    conn.commit()
+    return facts
+
+
+def transitive_closure() -> Program:
+    return Program(
+        [
+            Rule.create("T", ["?x", "?y"], [("E", ["?x", "?y"])]),
+            Rule.create("T", ["?x", "?z"], [("T", ["?x", "?y"]), ("E", ["?y", "?z"])]),
+        ]
+    )
+
+
+def rdfs() -> Program:
+    return Program(
+        [
+            Rule.create("T", ["?s", "?p", "?o"], [("RDF", ["?s", "?p", "?o"])]),
+            Rule.create(
+                "T",
+                ["?y", 0, "?x"],
+                [("T", ["?a", 3, "?x"]), ("T", ["?y", "?a", "?z"])],
+            ),
+            Rule.create(
+                "T",
+                ["?z", 0, "?x"],
+                [("T", ["?a", 4, "?x"]), ("T", ["?y", "?a", "?z"])],
+            ),
+            Rule.create(
+                "T",
+                ["?x", 2, "?z"],
+                [("T", ["?x", 2, "?y"]), ("T", ["?y", 2, "?z"])],
+            ),
+            Rule.create(
+                "T",
+                ["?x", 1, "?z"],
+                [("T", ["?x", 1, "?y"]), ("T", ["?y", 1, "?z"])],
+            ),
+            Rule.create(
+                "T",
+                ["?z", 0, "?y"],
+                [("T", ["?x", 1, "?y"]), ("T", ["?z", 0, "?x"])],
+            ),
+            Rule.create(
+                "T",
+                ["?x", "?b", "?y"],
+                [("T", ["?a", 2, "?b"]), ("T", ["?x", "?a", "?y"])],
+            ),
+        ]
+    )
+
+
+# Loads scale of the input file and returns the number of facts loaded
+type Loader = Callable[[Connection, str, float], int]  # type: ignore
+# name -> (program, loader, input path)
+type Workload = tuple[Callable[[], Program], Loader, str]  # type: ignore
+WORKLOADS: dict[str, Workload] = {
+    "dense": (transitive_closure, setup_database, "test/data/dense.txt"),
+    "sparse": (transitive_closure, setup_database, "test/data/sparse.txt"),
+    "rdf": (rdfs, setup_database_rdf, "test/data/lubm1.nt"),
+}
+
+
+class Backend:
+    def __init__(self, db_type: str, data_dir: str, snapshots: bool = True) -> None:
+        self.db_type = db_type
+        self.data_dir = data_dir
+        # Local backends copy a preloaded template file instead of reloading
+        self.snapshots = snapshots and db_type in LOCAL_BACKENDS
+        if db_type in LOCAL_BACKENDS:
+            self.db_data: dict[str, Any] = {
+                "db": os.path.join(data_dir, f"benchmark_{db_type}.db")
+            }
+        else:
+            self.db_data = SERVER_DB_DATA[db_type]
+
+    def connect(self) -> tuple[sqlalchemy.Engine, Connection]:
+        data = self.db_data
+        if self.db_type == "sqlite":
+            url = f"sqlite:///{data['db']}"
+        elif self.db_type == "duckdb":
+            url = f"duckdb:///{data['db']}"
+        elif self.db_type == "mysql":
+            url = (
+                f"mysql+mysqldb://{data['user']}:{data['password']}"
+                f"@{data['host']}/{data['db']}"
+            )
+        else:
+            url = (
+                f"postgresql+psycopg://{data['user']}:{data['password']}"
+                f"@{data['host']}:{data['port']}/{data['db']}"
+            )
+        engine = sqlalchemy.create_engine(url)
+        return engine, engine.connect()
+
+    def reset(self, program: Program):
+        if self.db_type in LOCAL_BACKENDS:
+            try:
+                os.remove(self.db_data["db"])
+            except FileNotFoundError:
+                pass
+            return
+        # Server databases are shared, so drop every table the program touches
+        tables: list[str] = []
+        for rule in program:
+            tables.append(rule.head.symbol)
+            tables.extend(atom.symbol for atom in rule.body)
+        engine, conn = self.connect()
+        for table in dict.fromkeys(tables):
+            for prefix in [
+                "",
+                DELTA_PREFIX,
+                f"{DELTA_PREFIX}{DELTA_PREFIX}",
+                OLD_PREFIX,
+            ]:
+                conn.execute(text(f"DROP TABLE IF EXISTS {prefix}{table}"))
+        conn.commit()
+        conn.close()
+        engine.dispose()
+
+    def load(self, workload: str, scale: float) -> int:
+        program, _, input_path = WORKLOADS[workload]
+        self.reset(program())
+        if not self.snapshots:
+            return self.load_input(workload, scale)
+        # Templates are rebuilt when the input file is newer than them, or when
+        # either of their files is missing
+        template = os.path.join(
+            self.data_dir, f"template_{self.db_type}_{workload}_{scale}.db"
+        )
+        facts_path = f"{template}.json"
+        if (
+            os.path.exists(template)
+            and os.path.exists(facts_path)
+            and os.path.getmtime(facts_path) >= os.path.getmtime(input_path)
+        ):
+            shutil.copyfile(template, self.db_data["db"])
+            with open(facts_path) as f:
+                return json.load(f)["facts"]
+        facts = self.load_input(workload, scale)
+        shutil.copyfile(self.db_data["db"], template)
+        with open(facts_path, "w") as f:
+            json.dump({"facts": facts}, f)
+        return facts
+
+    def load_edges(self, edges: Iterable[tuple[int, int]]) -> int:
+        # Loads generated edges for the transitive closure program
+        self.reset(transitive_closure())
+        engine, conn = self.connect()
+        create_edge_tables(conn)
+        facts = bulk_insert(conn, "E", distinct(edges))
+        conn.commit()
+        conn.close()
+        engine.dispose()
+        return facts
+
+    def size(self) -> int:
+        # Bytes on disk of a local database, -1 for servers
+        if self.db_type not in LOCAL_BACKENDS:
+            return -1
+        path = self.db_data["db"]
+        return sum(
+            os.path.getsize(file)
+            for file in [path, f"{path}.wal", f"{path}-wal"]
+            if os.path.exists(file)
+        )
+
+    def load_input(self, workload: str, scale: float) -> int:
+        _, loader, input_path = WORKLOADS[workload]
+        engine, conn = self.connect()
+        facts = loader(conn, input_path, scale)
+        conn.close()
+        engine.dispose()
+        return facts
+
+
+def run_once(
+    backend: Backend, workload: str, test_run: int, **options: Any
+) -> tuple[int, list[StatementRecord]]:
+    compiler = Compiler(
+        backend.db_type, backend.db_data, WORKLOADS[workload][0](), test_run, **options
+    )
+    t1 = time.perf_counter_ns()
+    compiler.poll()
+    t2 = time.perf_counter_ns()
+    records = compiler.dump_benchmark()
+    compiler.close()
+    return t2 - t1, records
+
+
+def run_cell(
+    backend: Backend,
+    workload: str,
+    scale: float,
+    warmup: int,
+    repetitions: int,
+    **options: Any,
+) -> dict[str, Any]:
+    # Every run starts from freshly loaded data, warmup runs are discarded.
+    # Loading is timed separately and never counts towards the samples.
+    samples: list[int] = []
+    load_samples: list[int] = []
+    statements: list[list[StatementRecord]] = []
+    facts = 0
+    for i in range(warmup + repetitions):
+        t1 = time.perf_counter_ns()
+        facts = backend.load(workload, scale)
+        t2 = time.perf_counter_ns()
+        elapsed_ns, records = run_once(backend, workload, i, **options)
+        if i >= warmup:
+            samples.append(elapsed_ns)
+            load_samples.append(t2 - t1)
+            statements.append(records)
+    return {
+        "backend": backend.db_type,
+        "workload": workload,
+        "scale": scale,
+        "input_facts": facts,
+        "samples_ns": samples,
+        "summary_ns": summarize(samples),
+        "load_samples_ns": load_samples,
+        "statements": statements,
+    }
+
+
+def package_version(name: str) -> str | None:
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+def environment() -> dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": commit,
+        "python": sys.version,
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "hostname": platform.node(),
+        "packages": {
+            name: package_version(name)
+            for name in ["sqlalchemy", "sqlglot", "duckdb", "duckdb-engine"]
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Datalog materialization")
+    parser.add_argument(
+        "--backend",
+        nargs="+",
+        default=["sqlite", "duckdb"],
+        choices=["sqlite", "duckdb", "mysql", "postgres"],
+    )
+    parser.add_argument(
+        "--workload", nargs="+", default=["dense", "sparse"], choices=list(WORKLOADS)
+    )
+    parser.add_argument(
+        "--scale",
+        nargs="+",
+        type=float,
+        default=[1.0],
+        help="fractions of the input lines to load, repeated facts are loaded once",
+    )
+    parser.add_argument("--repetitions", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument(
+        "--scratch-mode", choices=[m.name for m in ScratchMode], default="DROP"
+    )
+    parser.add_argument(
+        "--commit-scope", choices=[s.name for s in CommitScope], default="STATEMENT"
+    )
+    parser.add_argument(
+        "--no-profile",
+        action="store_true",
+        help="skip per statement timing, statements are then not recorded",
+    )
+    parser.add_argument(
+        "--no-snapshot",
+        action="store_true",
+        help="reload SQLite and DuckDB inputs instead of copying a template",
+    )
+    parser.add_argument(
+        "--plan-cache",
+        help="directory to reuse compiled programs from, across repetitions and runs",
+    )
+    parser.add_argument("--data-dir", default="test/data")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    options = {
+        "scratch_mode": ScratchMode[args.scratch_mode],
+        "commit_scope": CommitScope[args.commit_scope],
+        "profile": not args.no_profile,
+        "plan_cache": PlanCache(args.plan_cache) if args.plan_cache else None,
+    }
+    results: list[dict[str, Any]] = []
+    for db_type in args.backend:
+        backend = Backend(db_type, args.data_dir, not args.no_snapshot)
+        for workload in args.workload:
+            for scale in args.scale:
+                result = run_cell(
+                    backend, workload, scale, args.warmup, args.repetitions, **options
+                )
+                summary = result["summary_ns"]
+                print(
+                    f"{db_type:>8} {workload:>8} {scale:>5} "
+                    f"median {summary['median'] / 1e6:.1f} ms "
+                    f"p95 {summary['p95'] / 1e6:.1f} ms "
+                    f"stddev {summary['stddev'] / 1e6:.1f} ms"
+                )
+                results.append(result)
+        if db_type in LOCAL_BACKENDS:
+            backend.reset(Program([]))
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "environment": environment(),
+                "config": {
+                    "warmup": args.warmup,
+                    "repetitions": args.repetitions,
+                    "scratch_mode": args.scratch_mode,
+                    "commit_scope": args.commit_scope,
+                    "profile": not args.no_profile,
+                    "plan_cache": args.plan_cache,
+                },
+                "results": results,
+            },
+            f,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,33 @@
+import cProfile
+import os
+import time
 from typing import Any
 
-import sqlalchemy
-
-from conn_profiler import ConnectionProfiler, Tag
-from datalog import Program, Symbol
-from delta_program import DELTA_PREFIX, make_delta_program
-from dependency_graph import sort_program
+from conn_profiler import (
+    CommitScope,
+    ConnectionProfiler,
+    PlanRecord,
+    StatementRecord,
+    Tag,
+    UnprofiledConnection,
+)
+from datalog import Program, Rule, Symbol
+from delta_program import DELTA_PREFIX, OLD_PREFIX
 from evaluator import RuleEvaluator
-from helpers import split_program
+from observers import CompilerObserver
+from plan_cache import PlanCache, compile_program
+from scratch import ScratchMode, ScratchTables
+from sinks import StatementSink
+
+
+# (test_run, iter, relation, new facts, eval facts before dedup or -1)
+type ConvergenceRecord = tuple[int, int, str, int, int]  # type: ignore
 
 
-def get_table_row_count(conn: ConnectionProfiler, table_name: str) -> int:
-    result = conn.execute(Tag.FACT_COUNT, f"SELECT COUNT(*) FROM {table_name}")
+def get_table_row_count(
+    conn: ConnectionProfiler, table_name: str, tag: Tag = Tag.FACT_COUNT
+) -> int:
+    result = conn.execute(tag, f"SELECT COUNT(*) FROM {table_name}")
     return list(result.first())[0]
 
 
@@ -22,18 +38,96 @@ def get_table_names(program: Program) -> set[str]:
     return table_names
 
 
-def get_total_fact_count(connection, table_names: set[str]) -> int:
-    fact_count = 0
-    for table in table_names:
-        fact_count += get_table_row_count(connection, table)
-    return fact_count
+def get_fact_counts(connection, table_names: set[str]) -> dict[str, int]:
+    return {table: get_table_row_count(connection, table) for table in table_names}
+
+
+def convergence_report(records: list[ConvergenceRecord]) -> dict[str, Any]:
+    # Groups new and evaluated fact counts per relation. Evaluated facts that
+    # are not new were derived redundantly.
+    report: dict[str, Any] = {}
+    for test_run, iter, relation, new_facts, eval_facts in records:
+        relation_report = report.setdefault(
+            relation,
+            {
+                "test_run": test_run,
+                "iterations": [],
+                "new_facts": 0,
+                "eval_facts": 0,
+                "last_productive_iter": -1,
+            },
+        )
+        iteration: dict[str, Any] = {"iter": iter, "new_facts": new_facts}
+        relation_report["new_facts"] += new_facts
+        if new_facts > 0:
+            relation_report["last_productive_iter"] = iter
+        if eval_facts >= 0:
+            iteration["eval_facts"] = eval_facts
+            iteration["redundant_facts"] = eval_facts - new_facts
+            relation_report["eval_facts"] += eval_facts
+        relation_report["iterations"].append(iteration)
+    for relation_report in report.values():
+        eval_facts = relation_report["eval_facts"]
+        relation_report["redundancy"] = (
+            1 - relation_report["new_facts"] / eval_facts if eval_facts else 0.0
+        )
+    return report
 
 
 class Compiler:
     def __init__(
-        self, db_type: str, db_data: dict[str, Any], program: Program, test_run: int
+        self,
+        db_type: str,
+        db_data: dict[str, Any],
+        program: Program,
+        test_run: int,
+        scratch_mode: ScratchMode = ScratchMode.DROP,
+        commit_scope: CommitScope = CommitScope.STATEMENT,
+        batch_statements: bool = True,
+        slow_statement_ns: int | None = None,
+        explain_analyze: bool = False,
+        trace: bool = False,
+        profile: bool = True,
+        sink: StatementSink | None = None,
+        convergence_telemetry: bool = False,
+        cprofile_dir: str | None = None,
+        observers: list[CompilerObserver] | None = None,
+        plan_cache: PlanCache | None = None,
+        skip_empty_deltas: bool = True,
     ):
-        self.setup_connection(db_type, db_data, test_run)
+        self.observers = observers if observers is not None else []
+        self.setup_connection(
+            db_type,
+            db_data,
+            test_run,
+            profile,
+            commit_scope=commit_scope,
+            batch_statements=batch_statements,
+            slow_statement_ns=slow_statement_ns,
+            explain_analyze=explain_analyze,
+            trace=trace,
+            sink=sink,
+            observers=self.observers,
+        )
+        self.scratch = ScratchTables(db_type, scratch_mode)
+        # New facts per relation and iteration, and with convergence_telemetry
+        # also the eval table sizes before dedup
+        self.convergence_telemetry = convergence_telemetry
+        self.convergence: list[ConvergenceRecord] = []
+        self.eval_facts: dict[str, int] = {}
+        self.idb_relations = get_table_names(program)
+        # The poll dumps its pstats file here when set
+        self.cprofile_dir = cprofile_dir
+        self.closed = False
+        # Compiled programs are reused across compilers when set
+        self.plan_cache = plan_cache
+        # Rules with an empty delta input derive nothing and are skipped
+        self.skip_empty_deltas = skip_empty_deltas
+        self.delta_rows: dict[str, bool] = {}
+        self.skipped_rules: dict[str, int] = {}
+        # Hoisted tables and partitions, filled on first use in the recursive
+        # stage and kept until it ends
+        self.kept_tables: set[str] = set()
         self.base_relations: dict[str, list[str]] = {}
         self.gen_base_idx_list(program)
 
@@ -41,26 +135,62 @@ class Compiler:
         self.delta_relations: set[str] = set()
         self.current_delta_relations: set[str] = set()
 
+        init_sql: list[str] = []
         for rule in program:
             relation = rule.head.symbol
             delta_relation = f"{DELTA_PREFIX}{rule.head.symbol}"
             current_delta_relation = f"{DELTA_PREFIX}{DELTA_PREFIX}{rule.head.symbol}"
             self.relations.add(rule.head.symbol)
             self.delta_relations.add(delta_relation)
-            self.create_table_like(delta_relation, relation)
+            init_sql.append(self.create_table_like_sql(delta_relation, relation))
             self.current_delta_relations.add(current_delta_relation)
-            self.create_table_like(current_delta_relation, relation)
+            scratch_sql = self.scratch.create(
+                current_delta_relation, self.get_idx_list(relation)
+            )
+            if scratch_sql:
+                init_sql.append(scratch_sql)
             for body_atom in rule.body:
                 body_relation = body_atom.symbol
                 body_delta_relation = f"{DELTA_PREFIX}{body_atom.symbol}"
                 self.relations.add(body_atom.symbol)
-                self.create_table_like(body_delta_relation, body_relation)
+                init_sql.append(
+                    self.create_table_like_sql(body_delta_relation, body_relation)
+                )
                 self.delta_relations.add(body_delta_relation)
+        # Table creations are independent, so they go out as one batch
+        self.conn.execute_batch(Tag.COMPILER_INIT, list(dict.fromkeys(init_sql)))
+        self.conn.commit()
         self.init_programs(program)
 
-    def dump_benchmark(self) -> list[tuple[int, int, str, int, str]]:
+    def close(self):
+        # A compiler polls once: the poll releases the connection and engine
+        # and only flushes the sink, which stays readable through
+        # dump_benchmark. Closing releases whatever is still open.
+        if self.closed:
+            return
+        self.closed = True
+        self.conn.close()
+        self.engine.dispose()
+        self.conn.sink.close()
+
+    def dump_benchmark(self) -> list[StatementRecord]:
         return self.conn.statements
 
+    def dump_convergence(self) -> list[ConvergenceRecord]:
+        return self.convergence
+
+    def dump_plans(self) -> dict[str, list[PlanRecord]]:
+        return self.conn.plans
+
+    def dump_skipped_rules(self) -> dict[str, int]:
+        return self.skipped_rules
+
+    def export_chrome_trace(self, path: str):
+        self.conn.tracer.export_chrome(path)
+
+    def export_otlp_trace(self, path: str):
+        self.conn.tracer.export_otlp(path)
+
     def gen_base_idx_list(self, program: Program):
         for rule in program:
             if rule.head.symbol not in self.base_relations:
@@ -80,7 +210,17 @@ class Compiler:
         relation = relation.strip(DELTA_PREFIX)
         return self.base_relations[relation]
 
-    def setup_connection(self, db_type: str, db_data: dict[str, Any], test_run: int):
+    def setup_connection(
+        self,
+        db_type: str,
+        db_data: dict[str, Any],
+        test_run: int,
+        profile: bool,
+        **profiler_options: Any,
+    ):
+        # Imported here so that loading the compiler stays cheap
+        import sqlalchemy
+
         if db_type == "sqlite":
             self.engine = sqlalchemy.create_engine(f"sqlite:///{db_data['db']}")
         if db_type == "duckdb":
@@ -99,21 +239,119 @@ class Compiler:
                 isolation_level="AUTOCOMMIT",
             )
         sqla_conn = self.engine.connect()
-        self.conn = ConnectionProfiler(sqla_conn, test_run)
+        profiler = ConnectionProfiler if profile else UnprofiledConnection
+        self.conn = profiler(sqla_conn, test_run, **profiler_options)
         if db_type == "materialize":
             sqla_conn.exec_driver_sql("SET SESSION statement_timeout = '6000s'")
 
-    def create_table_like(self, new_relation: str, relation: str):
+    def create_table_like_sql(self, new_relation: str, relation: str) -> str:
         col_list = self.get_idx_list(relation)
-        sql_str = f"CREATE TABLE IF NOT EXISTS {new_relation} ({', '.join(col_list)})"
-        self.conn.execute(Tag.COMPILER_INIT, sql_str)
-        self.conn.commit()
+        return f"CREATE TABLE IF NOT EXISTS {new_relation} ({', '.join(col_list)})"
 
     def init_programs(self, program: Program):
-        self.nonrecursive_delta_program, self.recursive_delta_program = split_program(
-            make_delta_program(program, True)
-        )
-        self.nonrecursive_delta_program = sort_program(self.nonrecursive_delta_program)
+        t1 = time.perf_counter_ns()
+        compiled_here = True
+        if self.plan_cache:
+            hits = self.plan_cache.hits
+            compiled = self.plan_cache.get(program, self.scratch.db_type)
+            compiled_here = self.plan_cache.hits == hits
+        else:
+            compiled = compile_program(program)
+        self.nonrecursive_delta_program = compiled.nonrecursive
+        self.recursive_delta_program = compiled.recursive
+        # Every rule is planned once and evaluated with the same plan each
+        # iteration
+        self.rule_plans = compiled.rule_plans
+        self.delta_inputs: dict[Rule, list[str]] = {
+            rule: [
+                atom.symbol
+                for atom in rule.body
+                if atom.symbol in self.delta_relations
+            ]
+            for rule in compiled.rule_plans
+        }
+        self.recursive_delta_relations: set[str] = {
+            rule.head.symbol for rule in self.recursive_delta_program
+        }
+        # Selection partitions by the relation they select from, with their
+        # filters
+        self.partitions: dict[str, dict[str, str]] = {}
+        for rule in self.recursive_delta_program:
+            for op in self.rule_plans[rule].ops:
+                if op.partition:
+                    partitions = self.partitions.setdefault(op.inputs[0][0], {})
+                    partitions[op.table] = op.where  # type: ignore
+        t2 = time.perf_counter_ns()
+        # Planning is recorded per rule, the rest of the frontend as a whole.
+        # Loaded plans were planned by another compiler.
+        planning_ns = 0
+        if compiled_here:
+            for rule, plan in compiled.rule_plans.items():
+                rule_str = rule.serialize()
+                self.conn.save_point(Tag.PY_STACK, plan.stack_ns, rule_str)
+                self.conn.save_point(Tag.PY_RENDER, plan.render_ns, rule_str)
+                planning_ns += plan.stack_ns + plan.render_ns
+        self.conn.save_point(Tag.PY_FRONTEND, t2 - t1 - planning_ns, "")
+        # Relations the recursive variants also read as they were before the
+        # iteration, mapped to the table holding those facts
+        self.old_relations: dict[str, str] = {}
+        for rule in self.recursive_delta_program:
+            for atom in rule.body:
+                if atom.symbol.startswith(OLD_PREFIX):
+                    relation = atom.symbol.removeprefix(OLD_PREFIX)
+                    self.old_relations[relation] = atom.symbol
+        if self.old_relations:
+            self.conn.execute_batch(
+                Tag.COMPILER_INIT,
+                [
+                    self.create_table_like_sql(old_relation, relation)
+                    for relation, old_relation in self.old_relations.items()
+                ],
+            )
+            self.conn.commit()
+
+    def count_eval_facts(self, relation: str, eval_table: str):
+        if not self.convergence_telemetry:
+            return
+        eval_facts = get_table_row_count(self.conn, eval_table, Tag.TELEMETRY)
+        self.eval_facts[relation] = self.eval_facts.get(relation, 0) + eval_facts
+
+    def record_convergence(self, prev_counts: dict[str, int]) -> dict[str, int]:
+        cur_counts = get_fact_counts(self.conn, self.relations)
+        for relation in sorted(self.idb_relations):
+            self.convergence.append(
+                (
+                    self.conn.test_run,
+                    self.conn.iter,
+                    relation,
+                    cur_counts[relation] - prev_counts[relation],
+                    self.eval_facts.get(relation, -1),
+                )
+            )
+        self.eval_facts.clear()
+        return cur_counts
+
+    def has_rows(self, table: str) -> bool:
+        # Cached until the deltas are rewritten
+        if table not in self.delta_rows:
+            result = self.conn.execute(
+                Tag.DELTA_PROBE, f"SELECT 1 FROM {table} LIMIT 1"
+            )
+            self.delta_rows[table] = result.first() is not None
+        return self.delta_rows[table]
+
+    def skip_rule(self, rule: Rule) -> bool:
+        # The delta inputs are joined, one empty input means no facts
+        if not self.skip_empty_deltas:
+            return False
+        for relation in self.delta_inputs[rule]:
+            if not self.has_rows(relation):
+                rule_str = rule.serialize()
+                self.skipped_rules[rule_str] = (
+                    self.skipped_rules.get(rule_str, 0) + 1
+                )
+                return True
+        return False
 
     def get_delta_fact_count(self):
         fact_count = 0
@@ -122,17 +360,30 @@ class Compiler:
         return fact_count
 
     def materialize_nonrecursive_delta_program(self, nonrecursive_program: Program):
-        for idx, rule in enumerate(nonrecursive_program):
-            RuleEvaluator(self.conn, rule).step()
+        self.delta_rows.clear()
+        idx = 0
+        for rule in nonrecursive_program:
+            if self.skip_rule(rule):
+                continue
+            RuleEvaluator(
+                self.conn, rule, self.scratch, self.rule_plans[rule]
+            ).step()
             delta_relation_symbol = rule.head.symbol
+            # Materializing rewrites the head's delta
+            self.delta_rows.pop(delta_relation_symbol, None)
             # diff = list of newly evaluated facts that are NOT inside delta_relation
             # new_facts = select * from ddRelation
             # cur_facts = select * from dRelation
             eval_table = f"{DELTA_PREFIX}{delta_relation_symbol}"
             relation_symbol = delta_relation_symbol.strip(DELTA_PREFIX)
+            self.count_eval_facts(relation_symbol, eval_table)
+            # After the first rule the delta relation no longer holds every
+            # known fact, so facts already in the relation are excluded too
             self.conn.execute(
                 Tag.MAT_NONREC,
-                f"INSERT INTO {relation_symbol} SELECT * FROM  {eval_table} EXCEPT SELECT * FROM {delta_relation_symbol}",
+                f"INSERT INTO {relation_symbol} SELECT * FROM  {eval_table} "
+                f"EXCEPT SELECT * FROM {delta_relation_symbol} "
+                f"EXCEPT SELECT * FROM {relation_symbol}",
             )
             self.conn.commit()
             if idx == 0:
@@ -159,25 +410,40 @@ class Compiler:
                 self.conn.commit()
 
             # clear eval table
-            self.conn.execute(Tag.MAT_NONREC, f"DELETE FROM {eval_table}")
-            self.conn.commit()
+            self.conn.execute(Tag.MAT_NONREC, self.scratch.truncate(eval_table))
+            self.conn.commit(CommitScope.RULE)
+            idx += 1
+        self.conn.commit(CommitScope.STRATUM)
 
     def materialize_recursive_delta_program(self, recursive_program: Program):
+        self.delta_rows.clear()
         eval_relations: set[Symbol] = set()
-        for idx, rule in enumerate(recursive_program):
-            RuleEvaluator(self.conn, rule).step()
+        for rule in recursive_program:
+            if self.skip_rule(rule):
+                continue
+            RuleEvaluator(
+                self.conn,
+                rule,
+                self.scratch,
+                self.rule_plans[rule],
+                self.kept_tables,
+            ).step()
             delta_relation_symbol = rule.head.symbol
             eval_relations.add(delta_relation_symbol)
             # diff = evaluated facts that are NOT in delta_relation
             # new_facts = select * from ddRelation
             # cur_facts = select * from dRelation
-        for idx, delta_relation_symbol in enumerate(eval_relations):
+        for delta_relation_symbol in eval_relations:
             relation_symbol = delta_relation_symbol.strip(DELTA_PREFIX)
             eval_table = f"{DELTA_PREFIX}{delta_relation_symbol}"
             diff_table = f"DIFF_{eval_table}"
-            sql_str = f"CREATE TABLE {diff_table} ({', '.join(self.get_idx_list(relation_symbol))})"
-            self.conn.execute(Tag.MAT_REC, sql_str)
-            self.conn.commit()
+            self.count_eval_facts(relation_symbol, eval_table)
+            sql_str = self.scratch.create(
+                diff_table, self.get_idx_list(relation_symbol)
+            )
+            if sql_str:
+                self.conn.execute(Tag.MAT_REC, sql_str)
+                self.conn.commit()
             # insert diff into real table
             self.conn.execute(
                 Tag.MAT_REC,
@@ -192,43 +458,144 @@ class Compiler:
             self.conn.execute(
                 Tag.MAT_REC, f"INSERT INTO {relation_symbol} SELECT * FROM {diff_table}"
             )
-            if idx == 0:
-                self.conn.execute(Tag.MAT_REC, f"DROP TABLE {delta_relation_symbol}")
-                self.conn.commit()
-                sql_str = f"CREATE TABLE {delta_relation_symbol} ({', '.join(self.get_idx_list(relation_symbol))})"
-                self.conn.execute(Tag.MAT_REC, sql_str)
-                self.conn.commit()
+            partition_sql = self.append_partitions(relation_symbol, diff_table)
+            # The facts that were new this iteration are old in the next one
+            if relation_symbol in self.old_relations:
+                old_relation = self.old_relations[relation_symbol]
                 self.conn.execute(
                     Tag.MAT_REC,
-                    f"INSERT INTO {delta_relation_symbol} SELECT * FROM  {diff_table}",
+                    f"INSERT INTO {old_relation} SELECT * FROM {delta_relation_symbol}",
                 )
-            else:
-                self.conn.execute(
-                    Tag.MAT_REC,
-                    f"INSERT INTO {delta_relation_symbol} SELECT * FROM {diff_table}",
+                partition_sql += self.append_partitions(
+                    old_relation, delta_relation_symbol
                 )
-            # clear eval table
+            self.conn.execute_batch(Tag.SPJ_SELECT, partition_sql)
+            # The next delta is exactly the new facts, for every relation
+            self.conn.execute(Tag.MAT_REC, f"DROP TABLE {delta_relation_symbol}")
+            self.conn.commit()
+            columns = ", ".join(self.get_idx_list(relation_symbol))
+            sql_str = f"CREATE TABLE {delta_relation_symbol} ({columns})"
+            self.conn.execute(Tag.MAT_REC, sql_str)
+            self.conn.commit()
             self.conn.execute(
-                Tag.MAT_REC, f"DELETE FROM {DELTA_PREFIX}{delta_relation_symbol}"
+                Tag.MAT_REC,
+                f"INSERT INTO {delta_relation_symbol} SELECT * FROM  {diff_table}",
             )
-            self.conn.execute(Tag.MAT_REC, f"DROP TABLE {diff_table}")
+            # clear eval and diff tables
+            self.conn.execute_batch(
+                Tag.MAT_REC,
+                [self.scratch.truncate(eval_table), self.scratch.release(diff_table)],
+            )
+            self.conn.commit()
+        # Every rule of these relations was skipped, so they have no new facts
+        # and their deltas must not be read again
+        skipped_relations = self.recursive_delta_relations - eval_relations
+        stale_deltas: list[str] = []
+        for delta_relation in sorted(skipped_relations):
+            if not self.has_rows(delta_relation):
+                continue
+            relation = delta_relation.strip(DELTA_PREFIX)
+            if relation in self.old_relations:
+                old_relation = self.old_relations[relation]
+                stale_deltas.append(
+                    f"INSERT INTO {old_relation} SELECT * FROM {delta_relation}"
+                )
+                stale_deltas += self.append_partitions(old_relation, delta_relation)
+            stale_deltas.append(f"DELETE FROM {delta_relation}")
+        if stale_deltas:
+            self.conn.execute_batch(Tag.MAT_REC, stale_deltas)
             self.conn.commit()
 
+    def snapshot_old_relations(self):
+        # Before the first recursive iteration every fact outside the delta is
+        # old. The deltas keep them in step from then on.
+        snapshot_sql: list[str] = []
+        for relation, old_relation in self.old_relations.items():
+            snapshot_sql.append(f"DELETE FROM {old_relation}")
+            snapshot_sql.append(
+                f"INSERT INTO {old_relation} SELECT * FROM {relation} "
+                f"EXCEPT SELECT * FROM {DELTA_PREFIX}{relation}"
+            )
+        self.conn.execute_batch(Tag.MAT_REC, snapshot_sql)
+        self.conn.commit()
+
+    def clear_old_relations(self):
+        clear_sql = [f"DELETE FROM {table}" for table in self.old_relations.values()]
+        self.conn.execute_batch(Tag.MAT_REC, clear_sql)
+        self.conn.commit()
+
+    def append_partitions(self, relation: str, source: str) -> list[str]:
+        # The filled partitions of relation take the facts it gains from source
+        return [
+            f"INSERT INTO {table} SELECT * FROM {source} WHERE {where}"
+            for table, where in self.partitions.get(relation, {}).items()
+            if table in self.kept_tables
+        ]
+
+    def release_kept_tables(self):
+        release_sql = [
+            self.scratch.release(table) for table in sorted(self.kept_tables)
+        ]
+        self.conn.execute_batch(Tag.SPJ_CLEAR, release_sql)
+        self.conn.commit()
+        self.kept_tables.clear()
+
     def semi_naive_evaluation(
         self,
         nonrecursive_delta_program: Program,
         recursive_delta_program: Program,
     ):
+        fact_counts = get_fact_counts(self.conn, self.relations)
         self.conn.increment_iter()
-        self.materialize_nonrecursive_delta_program(nonrecursive_delta_program)
+        stratum_start = self.notify_stratum_start("nonrecursive")
+        with self.conn.span("iteration", iter=self.conn.iter, stratum="nonrecursive"):
+            self.materialize_nonrecursive_delta_program(nonrecursive_delta_program)
+            fact_counts = self.end_iteration(fact_counts, stratum_start)
+        self.notify_stratum_end("nonrecursive", stratum_start)
+        stratum_start = self.notify_stratum_start("recursive")
+        if self.old_relations:
+            self.snapshot_old_relations()
         while True:
             self.conn.increment_iter()
-            prev_nondelta_facts = get_total_fact_count(self.conn, self.relations)
-            self.materialize_recursive_delta_program(recursive_delta_program)
-            cur_nondelta_facts = get_total_fact_count(self.conn, self.relations)
-            new_facts = cur_nondelta_facts - prev_nondelta_facts
+            iteration_start = time.perf_counter_ns()
+            prev_nondelta_facts = sum(fact_counts.values())
+            with self.conn.span("iteration", iter=self.conn.iter, stratum="recursive"):
+                # A failed iteration rolls back to the state of the previous one
+                with self.conn.savepoint(CommitScope.ITERATION):
+                    self.materialize_recursive_delta_program(recursive_delta_program)
+                    fact_counts = self.end_iteration(fact_counts, iteration_start)
+                self.conn.commit(CommitScope.ITERATION)
+            new_facts = sum(fact_counts.values()) - prev_nondelta_facts
             if new_facts == 0:
                 break
+        if self.old_relations:
+            self.clear_old_relations()
+        if self.kept_tables:
+            self.release_kept_tables()
+        self.conn.commit(CommitScope.STRATUM)
+        self.notify_stratum_end("recursive", stratum_start)
+
+    def end_iteration(self, prev_counts: dict[str, int], start_ns: int):
+        cur_counts = self.record_convergence(prev_counts)
+        if self.observers:
+            elapsed_ns = time.perf_counter_ns() - start_ns
+            delta_sizes = {
+                relation: cur_counts[relation] - prev_counts[relation]
+                for relation in sorted(self.idb_relations)
+            }
+            for observer in self.observers:
+                observer.on_iteration_end(self.conn.iter, delta_sizes, elapsed_ns)
+        return cur_counts
+
+    def notify_stratum_start(self, stratum: str) -> int:
+        for observer in self.observers:
+            observer.on_stratum_start(stratum, self.conn.iter)
+        return time.perf_counter_ns()
+
+    def notify_stratum_end(self, stratum: str, start_ns: int):
+        elapsed_ns = time.perf_counter_ns() - start_ns
+        for observer in self.observers:
+            observer.on_stratum_end(stratum, self.conn.iter, elapsed_ns)
 
     def get_unprocessed_insertions(self) -> dict[str, list[Any]]:
         unprocessed_insertions: dict[str, list[Any]] = {}
@@ -245,32 +612,66 @@ class Compiler:
         #       Clear delta relation
         #   Get nondelta symbol
         #   Insert all facts into nondelta symbol
+        drain_sql: list[str] = []
         for delta_relation in self.delta_relations:
             relation = delta_relation.strip(DELTA_PREFIX)
-            self.conn.execute(
-                Tag.DRAIN,
-                f"INSERT INTO {relation} SELECT * FROM {delta_relation} EXCEPT SELECT * FROM {relation}",
+            drain_sql.append(
+                f"INSERT INTO {relation} SELECT * FROM {delta_relation} "
+                f"EXCEPT SELECT * FROM {relation}"
             )
-            self.conn.execute(Tag.DRAIN, f"DELETE FROM {delta_relation}")
-            self.conn.commit()
+            drain_sql.append(f"DELETE FROM {delta_relation}")
+        self.conn.execute_batch(Tag.DRAIN, drain_sql)
+        self.conn.commit()
 
     def poll(self):
+        profiler = cProfile.Profile() if self.cprofile_dir else None
+        if profiler:
+            profiler.enable()
+        try:
+            for observer in self.observers:
+                observer.on_poll_start(self.conn.test_run)
+            poll_start = time.perf_counter_ns()
+            with self.conn.span("poll", test_run=self.conn.test_run):
+                self.poll_deltas()
+                self.conn.commit(CommitScope.POLL)
+            elapsed_ns = time.perf_counter_ns() - poll_start
+            # Observers only hear about polls that completed
+            for observer in self.observers:
+                observer.on_poll_end(self.conn.test_run, elapsed_ns)
+        finally:
+            # A failed poll still releases the profiler, which is per thread,
+            # and keeps the statements recorded up to the failure
+            if profiler:
+                profiler.disable()
+                profiler.dump_stats(
+                    os.path.join(
+                        self.cprofile_dir,
+                        f"poll_{self.conn.test_run}.prof",
+                    )
+                )
+            self.conn.sink.flush()
+            self.conn.close()
+            self.engine.dispose()
+
+    def poll_deltas(self):
         unprocessed_insertions = self.get_unprocessed_insertions()
         if len(unprocessed_insertions) > 0:
             # Additions
             # for each drain relation
             #  dump all unprocessed EDB relations into delta EDB relations
             #  And in their respective place
-            for relation in self.relations:
-                self.conn.execute(
-                    Tag.COMPILER_INIT,
-                    f"INSERT INTO {DELTA_PREFIX}{relation} SELECT * FROM {relation}",
-                )
+            self.conn.execute_batch(
+                Tag.COMPILER_INIT,
+                [
+                    f"INSERT INTO {DELTA_PREFIX}{relation} SELECT * FROM {relation}"
+                    for relation in self.relations
+                ],
+            )
             self.conn.commit()
             # Evaluate
-            self.semi_naive_evaluation(
-                self.nonrecursive_delta_program, self.recursive_delta_program
-            )
-            self.drain_deltas()
-        self.conn.close()
-        self.engine.dispose()
+            with self.conn.span("semi_naive_evaluation"):
+                self.semi_naive_evaluation(
+                    self.nonrecursive_delta_program, self.recursive_delta_program
+                )
+            with self.conn.span("drain_deltas"):
+                self.drain_deltas()
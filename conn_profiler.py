@@ -1,8 +1,21 @@
 import time
-from enum import Enum, auto
-from typing import Any
+from contextlib import contextmanager
+from enum import Enum, IntEnum, auto
+from typing import TYPE_CHECKING, Any, Iterator
 
-from sqlalchemy import Connection, text
+from observers import CompilerObserver
+from sinks import MemorySink, StatementRecord, StatementSink
+from tracing import Tracer
+
+# sqlalchemy is imported where it is used, it dominates the import time of
+# tools that only need Tag
+if TYPE_CHECKING:
+    from sqlalchemy import Connection, CursorResult, Result
+
+# (test_run, iter, tag, elapsed_ns, statement, plan). With the rule the plans
+# are grouped by, the first four match the statement's record, also after a
+# capped sink dropped it.
+type PlanRecord = tuple[int, int, str, int, str, str]  # type: ignore
 
 
 class Tag(Enum):
@@ -15,46 +28,277 @@ class Tag(Enum):
     SPJ_JOIN = auto()
     SPJ_PROJECT = auto()
     SPJ_CLEAR = auto()
+    # Indexes on tables that are reused across recursive iterations
+    SPJ_INDEX = auto()
+    COMMIT = auto()
+    TELEMETRY = auto()
+    # Checks whether a delta input has rows before its rule runs
+    DELTA_PROBE = auto()
+    # Python side phases, timed outside of the database
+    PY_FRONTEND = auto()
+    PY_STACK = auto()
+    PY_RENDER = auto()
+
+
+PYTHON_TAGS: set[str] = {Tag.PY_FRONTEND.name, Tag.PY_STACK.name, Tag.PY_RENDER.name}
+
+
+# Commit points from the finest to the coarsest. A commit is only sent to the
+# database when its scope is at least the profiler's commit scope.
+class CommitScope(IntEnum):
+    STATEMENT = auto()
+    RULE = auto()
+    ITERATION = auto()
+    STRATUM = auto()
+    POLL = auto()
 
 
 class StatementData:
     def __init__(
-        self, test_run: int, iter: int, tag: Tag, elapsed: int, rule: str = ""
+        self,
+        test_run: int,
+        iter: int,
+        tag: Tag,
+        elapsed_ns: int,
+        rule: str = "",
+        rows_affected: int = -1,
+        rows_returned: int = 0,
     ) -> None:
         self.test_run = test_run
         self.iter = iter
         self.tag = tag
-        self.elapsed = elapsed
+        self.elapsed_ns = elapsed_ns
         self.rule = rule
+        # -1 when the driver does not report a row count
+        self.rows_affected = rows_affected
+        self.rows_returned = rows_returned
+
+    def serialize(self) -> StatementRecord:
+        return (
+            self.test_run,
+            self.iter,
+            self.tag.name,
+            self.elapsed_ns,
+            self.rule,
+            self.rows_affected,
+            self.rows_returned,
+        )
+
+
+def count_rows(stmt: str, result: "CursorResult") -> tuple["Result", int, int]:
+    # Buffers the rows of a query so they can be counted and still be fetched
+    if not result.returns_rows:
+        return result, result.rowcount, 0
+    frozen = result.freeze()
+    # DuckDB reports affected rows of DML and DDL as a single "Count" row
+    if list(result.keys()) == ["Count"] and stmt.lstrip()[:6].upper() != "SELECT":
+        rows_affected = frozen.data[0][0] if frozen.data else 0
+        return frozen(), rows_affected, 0
+    return frozen(), -1, len(frozen.data)
+
+
+# Drivers that accept several semicolon separated statements in one call
+MULTI_STATEMENT_DRIVERS: set[str] = {"duckdb_engine", "psycopg", "mysqldb"}
+
+# Plan statements per dialect: (without execution, with execution)
+EXPLAIN_PREFIXES: dict[str, tuple[str, str]] = {
+    "sqlite": ("EXPLAIN QUERY PLAN", "EXPLAIN QUERY PLAN"),
+    "duckdb": ("EXPLAIN", "EXPLAIN ANALYZE"),
+    "postgresql": ("EXPLAIN", "EXPLAIN ANALYZE"),
+    "mysql": ("EXPLAIN", "EXPLAIN ANALYZE"),
+}
+EXPLAINABLE: set[str] = {"SELECT", "INSERT", "DELETE", "UPDATE"}
+
+
+def time_by_side(records: list[StatementRecord]) -> dict[str, int]:
+    # Splits recorded time into Python work and database round trips
+    totals = {"python_ns": 0, "database_ns": 0}
+    for _, _, tag, elapsed_ns, _, _, _ in records:
+        side = "python_ns" if tag in PYTHON_TAGS else "database_ns"
+        totals[side] += elapsed_ns
+    return totals
+
 
-    def serialize(self) -> tuple[int, int, str, int, str]:
-        return (self.test_run, self.iter, self.tag.name, self.elapsed, self.rule)
+def changed_plans(
+    old: dict[str, list[PlanRecord]], new: dict[str, list[PlanRecord]]
+) -> list[tuple[str, str, str, str]]:
+    # Lists (rule, statement, old plan, new plan) for statements whose plan
+    # differs between two runs
+    changes: list[tuple[str, str, str, str]] = []
+    seen: set[tuple[str, str]] = set()
+    for rule, records in new.items():
+        old_plans = {stmt: plan for _, _, _, _, stmt, plan in old.get(rule, [])}
+        for _, _, _, _, stmt, plan in records:
+            if (rule, stmt) in seen or stmt not in old_plans:
+                continue
+            seen.add((rule, stmt))
+            if old_plans[stmt] != plan:
+                changes.append((rule, stmt, old_plans[stmt], plan))
+    return changes
 
 
 class ConnectionProfiler:
-    def __init__(self, conn: Connection, test_run: int) -> None:
+    def __init__(
+        self,
+        conn: "Connection",
+        test_run: int,
+        commit_scope: CommitScope = CommitScope.STATEMENT,
+        batch_statements: bool = True,
+        slow_statement_ns: int | None = None,
+        explain_analyze: bool = False,
+        trace: bool = False,
+        sink: StatementSink | None = None,
+        observers: list[CompilerObserver] | None = None,
+    ) -> None:
+        from sqlalchemy import text
+
+        # Imported once here instead of on every statement
+        self.text = text
         self.conn = conn
         self.test_run = test_run
+        self.commit_scope = commit_scope
+        self.batch_statements = (
+            batch_statements and conn.dialect.driver in MULTI_STATEMENT_DRIVERS
+        )
         self.iter = -1
-        self.statements: list[tuple[int, int, str, int, str]] = []
+        self.sink = sink if sink is not None else MemorySink()
+        # Statements slower than this get their plan captured
+        self.slow_statement_ns = slow_statement_ns
+        self.explain_analyze = explain_analyze
+        # Plans of slow statements grouped by rule serialization
+        self.plans: dict[str, list[PlanRecord]] = {}
+        self.tracer = Tracer(trace)
+        self.observers = observers if observers is not None else []
 
     def execute(self, tag: Tag, stmt: str, rule: str = "") -> Any:
-        t1 = time.perf_counter()
-        r = self.conn.execute(text(stmt))
-        t2 = time.perf_counter()
-        elapsed_time = int(round((t2 - t1) * 1000))
-        self.save_point(tag, elapsed_time, rule)
+        with self.tracer.span(tag.name, iter=self.iter):
+            t1 = time.perf_counter_ns()
+            r, rows_affected, rows_returned = count_rows(
+                stmt, self.conn.execute(self.text(stmt))
+            )
+            t2 = time.perf_counter_ns()
+        self.save_point(tag, t2 - t1, rule, rows_affected, rows_returned)
+        if self.slow_statement_ns is not None and t2 - t1 >= self.slow_statement_ns:
+            self.explain(tag, stmt, rule, t2 - t1)
         return r
 
-    def save_point(self, tag: Tag, elapsed: int, rule):
-        stmt_data = StatementData(self.test_run, self.iter, tag, elapsed, rule)
-        self.statements.append(stmt_data.serialize())
+    def explain(self, tag: Tag, stmt: str, rule: str, elapsed_ns: int):
+        dialect = self.conn.dialect.name
+        kind = stmt.split(None, 1)[0].upper()
+        # Batches cannot be explained as a whole
+        if dialect not in EXPLAIN_PREFIXES or kind not in EXPLAINABLE or ";" in stmt:
+            return
+        plain, analyze = EXPLAIN_PREFIXES[dialect]
+        # EXPLAIN ANALYZE runs the statement again, which is only safe for reads
+        prefix = analyze if self.explain_analyze and kind == "SELECT" else plain
+        rows = self.conn.execute(self.text(f"{prefix} {stmt}")).fetchall()
+        if dialect == "mysql":
+            plan = "\n".join(" | ".join(str(col) for col in row) for row in rows)
+        else:
+            plan = "\n".join(str(row[-1]) for row in rows)
+        self.plans.setdefault(rule, []).append(
+            (self.test_run, self.iter, tag.name, elapsed_ns, stmt, plan)
+        )
+
+    def execute_batch(self, tag: Tag, stmts: list[str], rule: str = ""):
+        # Sends the statements in one round trip when the driver allows it.
+        # Batches carry a single tag, so their time is still attributed per tag.
+        if not self.batch_statements or len(stmts) < 2:
+            for stmt in stmts:
+                self.execute(tag, stmt, rule)
+            return
+        self.execute(tag, ";\n".join(stmts), rule)
+
+    def save_point(
+        self,
+        tag: Tag,
+        elapsed_ns: int,
+        rule: str,
+        rows_affected: int = -1,
+        rows_returned: int = 0,
+    ):
+        stmt_data = StatementData(
+            self.test_run,
+            self.iter,
+            tag,
+            elapsed_ns,
+            rule,
+            rows_affected,
+            rows_returned,
+        )
+        record = stmt_data.serialize()
+        self.sink.write(record)
+        for observer in self.observers:
+            observer.on_statement(record)
+
+    @property
+    def statements(self) -> list[StatementRecord]:
+        return self.sink.records()
+
+    def span(self, name: str, **attributes: Any):
+        return self.tracer.span(name, **attributes)
 
     def increment_iter(self):
         self.iter += 1
 
-    def commit(self):
-        self.conn.commit()
+    def commit(self, scope: CommitScope = CommitScope.STATEMENT):
+        if scope < self.commit_scope:
+            return
+        with self.tracer.span(Tag.COMMIT.name, scope=scope.name):
+            t1 = time.perf_counter_ns()
+            self.conn.commit()
+            t2 = time.perf_counter_ns()
+        self.save_point(Tag.COMMIT, t2 - t1, "")
+
+    @contextmanager
+    def savepoint(self, scope: CommitScope) -> Iterator[None]:
+        """Rolls the scope back if it fails, where the backend allows it.
+
+        MySQL commits implicitly on every CREATE, DROP and TRUNCATE TABLE, and
+        its scratch tables are ordinary tables, so a savepoint would end with
+        the first scratch statement. There a failed scope keeps whatever it
+        did before the failure.
+        """
+        # Only needed when nothing inside the scope commits on its own
+        if self.commit_scope < scope or self.conn.dialect.name == "mysql":
+            yield
+            return
+        # DuckDB has no savepoints, so a failure rolls back the open transaction
+        if self.conn.dialect.name == "duckdb":
+            try:
+                yield
+            except BaseException:
+                self.conn.rollback()
+                raise
+            return
+        nested = self.conn.begin_nested()
+        try:
+            yield
+        except BaseException:
+            nested.rollback()
+            raise
+        nested.commit()
 
     def close(self):
         self.conn.close()
+
+
+class UnprofiledConnection(ConnectionProfiler):
+    # Sends statements straight to the connection without timing or recording
+
+    def execute(self, tag: Tag, stmt: str, rule: str = "") -> Any:
+        return self.conn.execute(self.text(stmt))
+
+    def save_point(
+        self,
+        tag: Tag,
+        elapsed_ns: int,
+        rule: str,
+        rows_affected: int = -1,
+        rows_returned: int = 0,
+    ):
+        pass
+
+    def commit(self, scope: CommitScope = CommitScope.STATEMENT):
+        if scope >= self.commit_scope:
+            self.conn.commit()
@@ -1,19 +1,57 @@
-from dataclasses import dataclass
-from typing import Any, NewType
+import sys
+from typing import Any, Iterable, NewType
+from weakref import WeakValueDictionary
 
 type TypedValue = str | bool | int | float  # type: ignore
 
 
 Symbol = NewType("Symbol", str)
 
+# Serialized strings are quoted, and characters that str.splitlines breaks on
+# are escaped so that a rule stays on one line
+LINE_BREAKS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+STRING_ESCAPES = str.maketrans(
+    {"\\": "\\\\", '"': '\\"'}
+    | {char: f"\\u{ord(char):04x}" for char in LINE_BREAKS}
+)
+
 
 class Term:
-    pass
+    __slots__ = ()
+
+
+class Immutable:
+    # Terms, atoms and rules are shared between programs instead of copied, so they
+    # cannot change after construction. Copies return the same object.
+    __slots__ = ()
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"{type(self).__name__} is immutable")
 
+    def __delattr__(self, name: str):
+        raise AttributeError(f"{type(self).__name__} is immutable")
 
-@dataclass
-class TermVariable(Term):
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo: dict[int, Any]):
+        return self
+
+
+class TermVariable(Immutable, Term):
+    # Interned, there is one object per name, so equality is identity
+    __slots__ = ("name", "_hash", "__weakref__")
     name: str
+    _interned: "WeakValueDictionary[str, TermVariable]" = WeakValueDictionary()
+
+    def __new__(cls, name: str) -> "TermVariable":
+        term = cls._interned.get(name)
+        if term is None:
+            term = super().__new__(cls)
+            object.__setattr__(term, "name", name)
+            object.__setattr__(term, "_hash", hash(f"?{name}"))
+            cls._interned[name] = term
+        return term
 
     def __str__(self):
         return self.name
@@ -22,15 +60,32 @@ class TermVariable(Term):
         return self.name
 
     def __hash__(self):
-        return hash(f"?{self.name}")
+        return self._hash
+
+    def __reduce__(self):
+        return TermVariable, (self.name,)
 
     def serialize(self):
         return f"?{self.name}"
 
 
-@dataclass
-class TermConstant(Term):
+class TermConstant(Immutable, Term):
+    # Interned by type and value, 1, 1.0 and True are different constants
+    __slots__ = ("value", "_hash", "__weakref__")
     value: TypedValue
+    _interned: "WeakValueDictionary[tuple[type, TypedValue], TermConstant]" = (
+        WeakValueDictionary()
+    )
+
+    def __new__(cls, value: TypedValue) -> "TermConstant":
+        key = (type(value), value)
+        term = cls._interned.get(key)
+        if term is None:
+            term = super().__new__(cls)
+            object.__setattr__(term, "value", value)
+            object.__setattr__(term, "_hash", hash(value))
+            cls._interned[key] = term
+        return term
 
     def __str__(self):
         return str(self.value)
@@ -39,49 +94,98 @@ class TermConstant(Term):
         return str(self.value)
 
     def __hash__(self):
-        return hash(self.value)
+        return self._hash
+
+    def __reduce__(self):
+        return TermConstant, (self.value,)
 
     def serialize(self):
+        if isinstance(self.value, str):
+            return f'"{self.value.translate(STRING_ESCAPES)}"'
         return str(self.value)
 
 
-class Atom:
+class Atom(Immutable):
+    __slots__ = ("symbol", "terms", "_hash")
+    symbol: Symbol
+    terms: tuple[Term, ...]
+
     def __init__(
         self,
         symbol: str,
-        terms: list[Term],
+        terms: Iterable[Term],
     ) -> None:
-        self.terms = terms
-        self.symbol = Symbol(symbol)
+        # Symbols are interned so comparing them is mostly an identity check
+        symbol = Symbol(sys.intern(symbol))
+        terms = tuple(terms)
+        object.__setattr__(self, "terms", terms)
+        object.__setattr__(self, "symbol", symbol)
+        object.__setattr__(self, "_hash", hash((symbol, terms)))
 
     def __str__(self):
-        return f"Atom({self.symbol}, {self.terms})"
+        return f"Atom({self.symbol}, {list(self.terms)})"
 
     def __repr__(self):
-        return f"Atom({self.symbol}, {self.terms})"
+        return f"Atom({self.symbol}, {list(self.terms)})"
 
     def __hash__(self):
-        return hash(tuple([self.symbol, tuple(self.terms)]))
+        return self._hash
+
+    def __eq__(self, other: object):
+        if self is other:
+            return True
+        if not isinstance(other, Atom) or self._hash != other._hash:
+            return False
+        return self.symbol == other.symbol and self.terms == other.terms
+
+    def __reduce__(self):
+        return Atom, (self.symbol, self.terms)
+
+    def with_symbol(self, symbol: str) -> "Atom":
+        # The terms are shared with the new atom
+        return Atom(symbol, self.terms)
 
     def serialize(self):
         terms = [term.serialize() for term in self.terms]
         return f"{self.symbol}({', '.join(terms)})"
 
 
-class Rule:
-    def __init__(self, head: Atom, body: list[Atom] = list()) -> None:
-        self.head = head
-        self.body = body
-        self.id = 0
+class Rule(Immutable):
+    __slots__ = ("head", "body", "_hash")
+    head: Atom
+    body: tuple[Atom, ...]
+
+    def __init__(self, head: Atom, body: Iterable[Atom] = ()) -> None:
+        body = tuple(body)
+        object.__setattr__(self, "head", head)
+        object.__setattr__(self, "body", body)
+        object.__setattr__(self, "_hash", hash((head, body)))
 
     def __str__(self):
-        return f"Rule({self.head}, {self.body})"
+        return f"Rule({self.head}, {list(self.body)})"
 
     def __repr__(self):
-        return f"Rule({self.head}, {self.body})"
+        return f"Rule({self.head}, {list(self.body)})"
 
     def __hash__(self):
-        return hash(tuple([self.head, tuple(self.body)]))
+        return self._hash
+
+    def __eq__(self, other: object):
+        if self is other:
+            return True
+        if not isinstance(other, Rule) or self._hash != other._hash:
+            return False
+        return self.head == other.head and self.body == other.body
+
+    def __reduce__(self):
+        return Rule, (self.head, self.body)
+
+    def with_head(self, head: Atom) -> "Rule":
+        return Rule(head, self.body)
+
+    def with_body_atom(self, idx: int, atom: Atom) -> "Rule":
+        # Every other body atom is shared with the new rule
+        return Rule(self.head, self.body[:idx] + (atom,) + self.body[idx + 1 :])
 
     def serialize(self):
         atoms = [atom.serialize() for atom in self.body]
@@ -115,8 +219,6 @@ class Program(list[Rule]):
     def __init__(self, rules: list[Rule]):
         super().__init__(rules)
         self.sort(key=lambda r: str(r))
-        for idx, rule in enumerate(self):
-            rule.id = idx
 
 
 Variable = NewType("Variable", str)
@@ -0,0 +1,256 @@
+import re
+from typing import Iterable, Iterator
+
+from datalog import (
+    Atom,
+    Program,
+    Rule,
+    Symbol,
+    Term,
+    TermConstant,
+    TermVariable,
+    TypedValue,
+)
+
+# Textual syntax, the one Rule.serialize writes:
+#
+#   T(?x, ?z) :- T(?x, ?y), E(?y, ?z)
+#   E(1, 2).
+#
+# A statement ends with "." or at the end of its line, and continues on the
+# next line after ":-", "," or inside parentheses. Constants are ints, floats
+# (inf and nan included), True/False, double-quoted strings or bare names,
+# which are strings. Comments start with % or #. Rule.serialize quotes every
+# string and escapes line breaks as \uXXXX, so serialized rules read back
+# unchanged.
+BLANK = re.compile(r"[ \t\r]*(?:[%#].*)?")
+ATOM_OPEN = re.compile(r"([^\W\d]\w*)[ \t\r]*\(")
+# An atom on one line without strings or comments, most atoms are like this
+SIMPLE_ATOM = re.compile(r"([^\W\d]\w*)\(([^()\"%#]*)\)[ \t\r]*")
+TERM = re.compile(
+    r"""
+    (?P<variable>\?\w+)
+    |(?P<float>-?(?:\d+(?:\.\d+)?[eE][-+]?\d+|\d+\.\d+|inf\b)|nan\b)
+    |(?P<int>-?\d+)
+    |(?P<string>"(?:[^"\\]|\\.)*")
+    |(?P<name>[^\W\d]\w*)
+    """,
+    re.VERBOSE,
+)
+ESCAPE = re.compile(r"\\(u[0-9a-fA-F]{4}|.)")
+KEYWORDS: dict[str, TypedValue] = {"True": True, "False": False}
+TERM_CACHE_SIZE = 4096
+
+type Fact = tuple[Symbol, tuple[TypedValue, ...]]  # type: ignore
+
+
+class ParseError(ValueError):
+    def __init__(self, source: str, line: int, column: int, message: str) -> None:
+        super().__init__(f"{source}:{line}:{column}: {message}")
+        self.source = source
+        self.line = line
+        self.column = column
+
+
+def unescape(match: re.Match) -> str:
+    escaped = match.group(1)
+    return chr(int(escaped[1:], 16)) if len(escaped) == 5 else escaped
+
+
+def make_term(kind: str, text: str) -> Term:
+    if kind == "variable":
+        return TermVariable(text[1:])
+    if kind == "int":
+        return TermConstant(int(text))
+    if kind == "float":
+        return TermConstant(float(text))
+    if kind == "string":
+        return TermConstant(ESCAPE.sub(unescape, text[1:-1]))
+    return TermConstant(KEYWORDS.get(text, text))
+
+
+class Parser:
+    # Scans one line at a time with anchored regexes. Parsing is linear in
+    # the input and only the current line is held in memory.
+    def __init__(self, lines: Iterable[str], source: str = "<string>") -> None:
+        self.source = source
+        self.lines = iter(lines)
+        self.line = 0
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+        # Term texts repeat a lot, "?x" is parsed once per cache lifetime
+        self.terms: dict[str, Term] = {}
+        self.next_line()
+
+    def next_line(self) -> bool:
+        line = next(self.lines, None)
+        if line is None:
+            self.eof = True
+            self.text = ""
+            self.pos = 0
+            return False
+        self.line += 1
+        self.text = line.rstrip("\n")
+        self.pos = 0
+        return True
+
+    def skip(self, newlines: bool):
+        # Skips blanks and comments, and line ends if the statement continues
+        if self.pos < len(self.text) and self.text[self.pos] not in " \t\r%#":
+            return
+        while True:
+            self.pos = BLANK.match(self.text, self.pos).end()  # type: ignore
+            if self.pos < len(self.text) or not newlines or not self.next_line():
+                return
+
+    def peek(self) -> str:
+        if self.pos < len(self.text):
+            return self.text[self.pos]
+        return "" if self.eof else "\n"
+
+    def error(self, message: str) -> ParseError:
+        char = self.peek()
+        found = {"": "end of input", "\n": "end of line"}.get(char, repr(char))
+        return ParseError(
+            self.source, self.line, self.pos + 1, f"{message}, found {found}"
+        )
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise self.error(f"expected {char!r}")
+        self.pos += 1
+
+    def simple_term(self, text: str) -> Term | None:
+        term = self.terms.get(text)
+        if term is None:
+            match = TERM.fullmatch(text.strip())
+            if match is None:
+                return None
+            if len(self.terms) >= TERM_CACHE_SIZE:
+                self.terms.clear()
+            term = make_term(match.lastgroup, match.group())  # type: ignore
+            self.terms[text] = term
+        return term
+
+    def simple_atom(self) -> Atom | None:
+        match = SIMPLE_ATOM.match(self.text, self.pos)
+        if match is None:
+            return None
+        symbol, args = match.groups()
+        terms: list[Term] = []
+        if args and not args.isspace():
+            for arg in args.split(","):
+                term = self.simple_term(arg)
+                if term is None:
+                    return None
+                terms.append(term)
+        self.pos = match.end()
+        return Atom(symbol, terms)
+
+    def term(self) -> Term:
+        match = TERM.match(self.text, self.pos)
+        if match is None:
+            raise self.error("expected a term")
+        self.pos = match.end()
+        return make_term(match.lastgroup, match.group())  # type: ignore
+
+    def atom(self) -> Atom:
+        atom = self.simple_atom()
+        if atom is not None:
+            return atom
+        # Atoms with strings or spread over lines, and syntax errors
+        match = ATOM_OPEN.match(self.text, self.pos)
+        if match is None:
+            raise self.error("expected an atom")
+        self.pos = match.end()
+        terms: list[Term] = []
+        self.skip(True)
+        if self.peek() != ")":
+            while True:
+                self.skip(True)
+                terms.append(self.term())
+                self.skip(True)
+                if self.peek() != ",":
+                    break
+                self.pos += 1
+        self.expect(")")
+        return Atom(match.group(1), terms)
+
+    def end_statement(self):
+        self.skip(False)
+        char = self.peek()
+        if char == ".":
+            self.pos += 1
+        elif char != "\n" and char != "":
+            raise self.error("expected end of statement")
+
+    def rule(self) -> Rule | None:
+        # None at the end of the input
+        self.skip(True)
+        if self.eof:
+            return None
+        head = self.atom()
+        body: list[Atom] = []
+        self.skip(False)
+        if self.text.startswith(":-", self.pos):
+            self.pos += 2
+            self.skip(True)
+            # A line ending in ":-" continues, so a rule without body atoms
+            # needs the ".", as in "T(1) :- ."
+            if self.peek() not in (".", ""):
+                body.append(self.atom())
+                self.skip(False)
+                while self.peek() == ",":
+                    self.pos += 1
+                    self.skip(True)
+                    body.append(self.atom())
+                    self.skip(False)
+        self.end_statement()
+        return Rule(head, body)
+
+    def fact(self) -> Fact | None:
+        # Facts are ground atoms without a body
+        self.skip(True)
+        if self.eof:
+            return None
+        line, column = self.line, self.pos + 1
+        atom = self.atom()
+        self.end_statement()
+        values: list[TypedValue] = []
+        for term in atom.terms:
+            if not isinstance(term, TermConstant):
+                raise ParseError(
+                    self.source, line, column, f"fact {atom.serialize()} is not ground"
+                )
+            values.append(term.value)
+        return atom.symbol, tuple(values)
+
+    def __iter__(self) -> Iterator[Rule]:
+        while (rule := self.rule()) is not None:
+            yield rule
+
+
+def parse_rules(lines: Iterable[str], source: str = "<string>") -> Iterator[Rule]:
+    return iter(Parser(lines, source))
+
+
+def parse_program(text: str, source: str = "<string>") -> Program:
+    return Program(list(parse_rules(text.splitlines(), source)))
+
+
+def parse_facts(lines: Iterable[str], source: str = "<string>") -> Iterator[Fact]:
+    parser = Parser(lines, source)
+    while (fact := parser.fact()) is not None:
+        yield fact
+
+
+def read_program(path: str) -> Program:
+    with open(path) as file:
+        return Program(list(parse_rules(file, path)))
+
+
+def read_facts(path: str) -> Iterator[Fact]:
+    # Streams the facts, the file stays open until the iterator is exhausted
+    with open(path) as file:
+        yield from parse_facts(file, path)
@@ -1,9 +1,10 @@
-from copy import deepcopy
 from typing import Final
 
 from datalog import Program, Symbol
 
 DELTA_PREFIX: Final[str] = "d"
+# The facts of a relation from before the current iteration
+OLD_PREFIX: Final[str] = "OLD_"
 
 
 def make_delta_program(program: Program, update: bool) -> Program:
@@ -14,8 +15,9 @@ def make_delta_program(program: Program, update: bool) -> Program:
     delta_rules_set = set()
 
     for rule in program:
-        delta_rule = deepcopy(rule)
-        delta_rule.head.symbol = Symbol(f"{DELTA_PREFIX}{delta_rule.head.symbol}")
+        delta_rule = rule.with_head(
+            rule.head.with_symbol(Symbol(f"{DELTA_PREFIX}{rule.head.symbol}"))
+        )
 
         contains_idb = False
         for atom_body in rule.body:
@@ -31,10 +33,33 @@ def make_delta_program(program: Program, update: bool) -> Program:
             # Otherwise consider each body atom and deltaify if necessary.
             for idx, body_atom in enumerate(rule.body):
                 if update or body_atom.symbol in idb_relation_symbols:
-                    new_rule = deepcopy(delta_rule)
-                    new_rule.body[idx].symbol = Symbol(
-                        f"{DELTA_PREFIX}{new_rule.body[idx].symbol}"
+                    new_rule = delta_rule.with_body_atom(
+                        idx,
+                        body_atom.with_symbol(
+                            Symbol(f"{DELTA_PREFIX}{body_atom.symbol}")
+                        ),
                     )
                     delta_rules_set.add(new_rule)
     delta_program = Program(list(delta_rules_set))
     return delta_program
+
+
+def make_old_new_program(program: Program, changing: set[Symbol]) -> Program:
+    # In the variant for the delta atom at position i, changing relations left
+    # of it read OLD_ instead, so a derivation from several new facts is made
+    # by one variant only. Each rule has one delta atom.
+    old_new_rules = []
+    for rule in program:
+        delta_idx = next(
+            idx
+            for idx, body_atom in enumerate(rule.body)
+            if body_atom.symbol.startswith(DELTA_PREFIX)
+        )
+        for idx, body_atom in enumerate(rule.body[:delta_idx]):
+            if body_atom.symbol in changing:
+                rule = rule.with_body_atom(
+                    idx,
+                    body_atom.with_symbol(Symbol(f"{OLD_PREFIX}{body_atom.symbol}")),
+                )
+        old_new_rules.append(rule)
+    return Program(old_new_rules)
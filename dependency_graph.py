@@ -1,43 +1,147 @@
-from copy import deepcopy
-
-import networkx as nx  # type: ignore
+import heapq
 
 from datalog import Program, Rule, Symbol
 
 
-def generate_rule_dependency_graph(program: Program) -> nx.DiGraph:
-    idb_relations: dict[Symbol, list[Rule]] = {}
-    output = nx.DiGraph()
-    for rule in program:
-        if idb_relations.get(rule.head.symbol):
-            idb_relations[rule.head.symbol].append(rule)
-        else:
-            idb_relations[rule.head.symbol] = [rule]
-        output.add_node(rule)
+class RuleGraph:
+    # Rules are nodes numbered by their position in the program, successors
+    # holds the rules that read each rule's head
+    def __init__(self, rules: list[Rule]) -> None:
+        self.rules = rules
+        self.successors: list[list[int]] = [[] for _ in rules]
+
+
+def generate_rule_dependency_graph(program: Program) -> RuleGraph:
+    graph = RuleGraph(list(program))
+    idb_relations: dict[Symbol, list[int]] = {}
+    for idx, rule in enumerate(graph.rules):
+        idb_relations.setdefault(rule.head.symbol, []).append(idx)
+    for idx, rule in enumerate(graph.rules):
+        # A rule reading the same relation twice depends on it once
+        for body_symbol in dict.fromkeys(atom.symbol for atom in rule.body):
+            for body_rule in idb_relations.get(body_symbol, []):
+                graph.successors[body_rule].append(idx)
+    return graph
+
+
+def strongly_connected_components(successors: list[list[int]]) -> list[list[int]]:
+    # Iterative Tarjan, components come out in reverse topological order
+    count = len(successors)
+    index = [-1] * count
+    low = [0] * count
+    on_stack = [False] * count
+    stack: list[int] = []
+    components: list[list[int]] = []
+    counter = 0
+    for root in range(count):
+        if index[root] != -1:
+            continue
+        # (node, next successor to visit), a resumed node has just returned
+        # from the successor before that one
+        work = [(root, 0)]
+        while work:
+            node, i = work.pop()
+            if i == 0:
+                index[node] = low[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+            else:
+                low[node] = min(low[node], low[successors[node][i - 1]])
+            edges = successors[node]
+            while i < len(edges):
+                successor = edges[i]
+                i += 1
+                if index[successor] == -1:
+                    work.append((node, i))
+                    work.append((successor, 0))
+                    break
+                if on_stack[successor]:
+                    low[node] = min(low[node], index[successor])
+            else:
+                if low[node] == index[node]:
+                    component: list[int] = []
+                    while True:
+                        member = stack.pop()
+                        on_stack[member] = False
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
+def changing_relations(program: Program) -> set[Symbol]:
+    # Relations that keep changing while recursive rules run: those on a
+    # dependency cycle and every relation derived from one
+    relations = list(
+        dict.fromkeys(
+            atom.symbol for rule in program for atom in [rule.head, *rule.body]
+        )
+    )
+    position = {relation: idx for idx, relation in enumerate(relations)}
+    successors: list[list[int]] = [[] for _ in relations]
     for rule in program:
-        for body_atom in rule.body:
-            body_atom_rules = idb_relations.get(body_atom.symbol)
-            if body_atom_rules:
-                for body_atom_rule in body_atom_rules:
-                    output.add_edge(body_atom_rule, rule)
-    return output
-
-
-def stratify(rule_graph: nx.DiGraph) -> list[list[Rule]]:
-    sccs = nx.kosaraju_strongly_connected_components(rule_graph)
-    # For each SCC, sort the rules based on a deterministic property, like their string representation
-    sorted_sccs: list[list[Rule]] = [
-        sorted(list(scc), key=lambda rule: rule.id) for scc in list(sccs)
+        for atom in rule.body:
+            successors[position[atom.symbol]].append(position[rule.head.symbol])
+    changing = [False] * len(relations)
+    # Tarjan yields components dependents first, so walking them backwards
+    # reaches every relation after all the relations it reads
+    for component in reversed(strongly_connected_components(successors)):
+        node = component[0]
+        if len(component) > 1 or node in successors[node]:
+            for member in component:
+                changing[member] = True
+        for member in component:
+            if changing[member]:
+                for successor in successors[member]:
+                    changing[successor] = True
+    return {relation for relation, flag in zip(relations, changing) if flag}
+
+
+def stratify(rule_graph: RuleGraph) -> list[list[Rule]]:
+    # SCCs in topological order. Among SCCs that are ready at the same time
+    # the one with the earliest rule in the program goes first, and the rules
+    # of an SCC keep their program order.
+    components = [
+        sorted(component)
+        for component in strongly_connected_components(rule_graph.successors)
+    ]
+    component_of = [0] * len(rule_graph.rules)
+    for idx, component in enumerate(components):
+        for node in component:
+            component_of[node] = idx
+    dependents: list[set[int]] = [set() for _ in components]
+    for node, successors in enumerate(rule_graph.successors):
+        for successor in successors:
+            if component_of[node] != component_of[successor]:
+                dependents[component_of[node]].add(component_of[successor])
+    in_degree = [0] * len(components)
+    for targets in dependents:
+        for target in targets:
+            in_degree[target] += 1
+    ready = [
+        (component[0], idx)
+        for idx, component in enumerate(components)
+        if in_degree[idx] == 0
     ]
-    return list(sorted_sccs)
+    heapq.heapify(ready)
+    strata: list[list[Rule]] = []
+    while ready:
+        _, idx = heapq.heappop(ready)
+        strata.append([rule_graph.rules[node] for node in components[idx]])
+        for target in dependents[idx]:
+            in_degree[target] -= 1
+            if in_degree[target] == 0:
+                heapq.heappush(ready, (components[target][0], target))
+    return strata
 
 
 def sort_program(program: Program) -> Program:
-    rule_graph = generate_rule_dependency_graph(deepcopy(program))
+    rule_graph = generate_rule_dependency_graph(program)
     stratification = stratify(rule_graph)
     sorted_program = Program([])
     for program_strat in stratification:
         for rule in program_strat:
-            sorted_program.append(deepcopy(rule))
-    sorted_program.reverse()
+            sorted_program.append(rule)
     return sorted_program
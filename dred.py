@@ -1,7 +1,6 @@
-from copy import deepcopy
 from typing import Final
 
-from datalog import Program, Symbol
+from datalog import Program, Rule, Symbol
 
 OVERDELETION_PREFIX: Final[str] = "delete_"
 REDERIVATION_PREFIX: Final[str] = "rederive_"
@@ -11,14 +10,15 @@ def make_overdeletion_program(program: Program) -> Program:
     overdeletion_rules_set = set()
 
     for rule in program:
-        overdeletion_rule = deepcopy(rule)
-        overdeletion_rule.head.symbol = Symbol(
-            f"{OVERDELETION_PREFIX}{overdeletion_rule.head.symbol}"
+        overdeletion_rule = rule.with_head(
+            rule.head.with_symbol(Symbol(f"{OVERDELETION_PREFIX}{rule.head.symbol}"))
         )
-        for idx, _ in enumerate(rule.body):
-            new_rule = deepcopy(overdeletion_rule)
-            new_rule.body[idx].symbol = Symbol(
-                f"{OVERDELETION_PREFIX}{new_rule.body[idx].symbol}"
+        for idx, body_atom in enumerate(rule.body):
+            new_rule = overdeletion_rule.with_body_atom(
+                idx,
+                body_atom.with_symbol(
+                    Symbol(f"{OVERDELETION_PREFIX}{body_atom.symbol}")
+                ),
             )
             overdeletion_rules_set.add(new_rule)
 
@@ -30,16 +30,12 @@ def make_rederivation_program(program: Program) -> Program:
     rederivation_rules_set = set()
 
     for rule in program:
-        rederivation_rule = deepcopy(rule)
-
-        rederivation_head = deepcopy(rederivation_rule.head)
-        rederivation_head.symbol = Symbol(
-            f"{OVERDELETION_PREFIX}{rederivation_head.symbol}"
+        rederivation_head = rule.head.with_symbol(
+            Symbol(f"{OVERDELETION_PREFIX}{rule.head.symbol}")
         )
-        rederivation_rule.body.insert(0, rederivation_head)
-
-        rederivation_rule.head.symbol = Symbol(
-            f"{REDERIVATION_PREFIX}{rederivation_rule.head.symbol}"
+        rederivation_rule = Rule(
+            rule.head.with_symbol(Symbol(f"{REDERIVATION_PREFIX}{rule.head.symbol}")),
+            (rederivation_head, *rule.body),
         )
         rederivation_rules_set.add(rederivation_rule)
 
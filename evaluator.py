@@ -1,10 +1,11 @@
+import time
+from dataclasses import dataclass, field
 from typing import Any
-import sqlglot
-import sqlglot.expressions
 
-from conn_profiler import ConnectionProfiler, Tag
+from conn_profiler import CommitScope, ConnectionProfiler, Tag
 from datalog import Rule
-from delta_program import DELTA_PREFIX
+from delta_program import DELTA_PREFIX, OLD_PREFIX
+from scratch import ScratchTables
 from stack import (
     Join,
     Move,
@@ -18,21 +19,45 @@ from stack import (
 )
 
 
-class RuleEvaluator:
-    def __init__(self, conn: ConnectionProfiler, rule: Rule) -> None:
-        self.conn = conn
+@dataclass
+class PlannedOp:
+    # One per stack instruction. Selects and joins fill a scratch table with
+    # sql, projects run sql as is and moves have nothing to run.
+    name: str
+    tag: Tag | None
+    table: str | None
+    columns: list[str]
+    sql: str
+    # Tables the op reads, each with the columns it is joined on
+    inputs: list[tuple[str, list[str]]] = field(default_factory=list)
+    # The filter of a select, in terms of its input's columns
+    where: str = ""
+    # Hoisted ops fill their table once for all recursive iterations and
+    # partitions are filled once, then appended with the new facts of each
+    # iteration. Either table gets an index on each column list in indexes.
+    hoisted: bool = False
+    partition: bool = False
+    indexes: list[list[str]] = field(default_factory=list)
+
+
+@dataclass
+class RulePlan:
+    rule: Rule
+    ops: list[PlannedOp]
+    # Time spent building the stack and rendering SQL with sqlglot
+    stack_ns: int = field(compare=False)
+    render_ns: int = field(compare=False)
+
+
+class RulePlanner:
+    def __init__(self, rule: Rule) -> None:
         self.rule = rule
-        self.join_counter = 0
-        self.select_counter = 0
-        self.temp_tables: list[str] = []
         # Maps relation names to a list of column names
         self.base_relations: dict[str, list[str]] = {}
         self.gen_base_idx_list(rule)
         # Maps join temporary names to a list of column names
         self.tmp_relations: dict[str, list[str]] = {}
-
-    def execute(self, tag: Tag, stmt: str) -> Any:
-        return self.conn.execute(tag, stmt, self.rule.serialize())
+        self.render_ns = 0
 
     def gen_base_idx_list(self, rule: Rule):
         self.base_relations[rule.head.symbol] = [
@@ -43,8 +68,10 @@ class RuleEvaluator:
             sym = body_atom.symbol
             if sym in self.base_relations:
                 continue
+            # OLD_ tables have the columns of their relation, like deltas
+            relation = sym.removeprefix(OLD_PREFIX).strip(DELTA_PREFIX)
             self.base_relations[sym] = [
-                f"{sym.strip(DELTA_PREFIX)}_{i}" for i in range(len(body_atom.terms))
+                f"{relation}_{i}" for i in range(len(body_atom.terms))
             ]
 
     def get_idx_list(self, relation: str) -> list[str]:
@@ -63,23 +90,27 @@ class RuleEvaluator:
         join_cols = left_cols + right_cols
         return join_cols
 
-    def execute_select(self, sql: str):
-        self.execute(Tag.SPJ_SELECT, sql)
-        self.conn.commit()
+    def plan(self) -> RulePlan:
+        t1 = time.perf_counter_ns()
+        stack = Stack(self.rule)
+        t2 = time.perf_counter_ns()
+        ops = self.plan_stack(stack)
+        return RulePlan(self.rule, ops, t2 - t1, self.render_ns)
 
-    def execute_join(self, sql: str):
-        self.execute(Tag.SPJ_JOIN, sql)
-        self.conn.commit()
+    def plan_stack(self, stack: Stack) -> list[PlannedOp]:
+        # Imported here, a compiler with cached plans never renders SQL
+        import sqlglot
+        import sqlglot.expressions
 
-    def step(self):
-        stack = Stack(self.rule)
+        ops: list[PlannedOp] = []
         penultimate_operation = len(stack) - 2
         relation_symbol_to_be_projected = self.rule.head.symbol
         for idx, op in enumerate(stack):
+            name = type(op).__name__
             if isinstance(op, Move):
                 if idx == penultimate_operation:
                     relation_symbol_to_be_projected = op.symbol
-                pass
+                ops.append(PlannedOp(name, None, None, [], ""))
             elif isinstance(op, Select):
                 index_name = f"{stringify_select(op)}"
                 select_result_name = index_name
@@ -87,32 +118,38 @@ class RuleEvaluator:
                     relation_symbol_to_be_projected = select_result_name
                 select_cols = self.get_idx_list(op.symbol)
                 temp_table_name = f"{select_result_name}"
+                t1 = time.perf_counter_ns()
                 # If value is a string, then surround it with single quotes
                 if isinstance(op.value, str):
                     select_filter = f"'{op.value}'"
                 else:
                     select_filter = op.value
+                where = f"{select_cols[op.column]} = {select_filter}"
                 sql = (
                     sqlglot.expressions.Select()
                     .select("*")
                     .from_(f"{op.symbol}")
-                    .where(f"{select_cols[op.column]} = {select_filter}")
+                    .where(where)
                 )
                 sql.set("exists", True)
                 sql = sql.sql()
+                self.render_ns += time.perf_counter_ns() - t1
 
                 ct_cols = []
                 for i in range(len(select_cols)):
                     ct_cols.append(select_cols[i] + ' INTEGER')
-                sql_str = f"CREATE TABLE IF NOT EXISTS {temp_table_name} ({", ".join(ct_cols)})"
-                self.execute(Tag.SPJ_SELECT, sql_str)
-                self.conn.commit()
-                sql_str = f"INSERT INTO {temp_table_name} {sql}"
-                self.execute(Tag.SPJ_SELECT, sql_str)
-
-                self.temp_tables.append(temp_table_name)
+                ops.append(
+                    PlannedOp(
+                        name,
+                        Tag.SPJ_SELECT,
+                        temp_table_name,
+                        ct_cols,
+                        sql,
+                        [(op.symbol, [])],
+                        where,
+                    )
+                )
                 self.tmp_relations[select_result_name] = select_cols
-                self.select_counter += 1
             elif isinstance(op, Join):
                 join_result_name = f"{stringify_join(op)}"
                 if idx == penultimate_operation:
@@ -135,8 +172,8 @@ class RuleEvaluator:
                     op.right_symbol,
                 )
                 self.tmp_relations[join_result_name] = join_cols
+                t1 = time.perf_counter_ns()
                 condition_list = []
-
                 for left_key, right_key in op.keys:
                     condition_list.append(
                         sqlglot.condition(
@@ -155,19 +192,19 @@ class RuleEvaluator:
                     )
                 )
                 sql = sql.sql()
+                self.render_ns += time.perf_counter_ns() - t1
                 ct_cols = []
                 for i in range(len(join_cols)):
                     ct_cols.append(join_cols[i] + ' INTEGER')
-                sql_str = f"CREATE TABLE IF NOT EXISTS {temp_table_name} ({", ".join(ct_cols)})"
-                self.execute(Tag.SPJ_JOIN, sql_str)
-                self.conn.commit()
-                sql_str = f"INSERT INTO {temp_table_name} {sql}"
-                self.execute(Tag.SPJ_JOIN, sql_str)
-
-                self.temp_tables.append(temp_table_name)
-                # self.execute_join(sql)
-                self.join_counter += 1
-
+                inputs = [
+                    (op.left_symbol, [left_cols[key] for key, _ in op.keys]),
+                    (op.right_symbol, [right_cols[key] for _, key in op.keys]),
+                ]
+                ops.append(
+                    PlannedOp(
+                        name, Tag.SPJ_JOIN, temp_table_name, ct_cols, sql, inputs
+                    )
+                )
             elif isinstance(op, Project):
                 column_list = []
                 from_symbol = f"{relation_symbol_to_be_projected}"
@@ -178,18 +215,138 @@ class RuleEvaluator:
                     elif isinstance(input, ProjectionInputValue):
                         column_list.append(input.value)
                 into_symbol = op.symbol
+                t1 = time.perf_counter_ns()
                 sql = sqlglot.expressions.insert(
                     sqlglot.select(*column_list)
                     .from_(f"{from_symbol}")  # type: ignore
                     .distinct(),  # TODO!: Performance issue
                     f"{DELTA_PREFIX}{into_symbol}",
                 ).sql()
-                self.execute(Tag.SPJ_PROJECT, sql)
-                self.conn.commit()
-        # Delete temporary tables
-        drop_sql = set()
-        for table_name in self.temp_tables:
-            drop_sql.add(f"DROP TABLE {table_name}")
-        for drop in drop_sql:
-            self.execute(Tag.SPJ_CLEAR, drop)
-        self.conn.commit()
+                self.render_ns += time.perf_counter_ns() - t1
+                ops.append(PlannedOp(name, Tag.SPJ_PROJECT, None, [], sql))
+        return ops
+
+
+def plan_rule(rule: Rule) -> RulePlan:
+    return RulePlanner(rule).plan()
+
+
+def plan_kept_tables(plans: list[RulePlan], changing: set[str]):
+    # Tables of recursive rules that are worth keeping across iterations.
+    # Selections and joins that only read relations which stay the same give
+    # the same table on every step and are hoisted. Selections of a changing
+    # relation or its OLD_ table only grow by the facts that relation gains,
+    # so they become partitions. Tables are named after their inputs, so
+    # rules share them.
+    indexes: dict[str, list[list[str]]] = {}
+    for plan in plans:
+        invariant: dict[str, bool] = {}
+        for op in plan.ops:
+            if op.table is None:
+                continue
+            op.hoisted = all(
+                invariant.get(
+                    table,
+                    not table.startswith((DELTA_PREFIX, OLD_PREFIX))
+                    and table not in changing,
+                )
+                for table, _ in op.inputs
+            )
+            invariant[op.table] = op.hoisted
+            op.partition = (
+                op.tag == Tag.SPJ_SELECT
+                and not op.hoisted
+                and not op.inputs[0][0].startswith(DELTA_PREFIX)
+            )
+            if op.hoisted or op.partition:
+                indexes.setdefault(op.table, [])
+    for plan in plans:
+        for op in plan.ops:
+            for table, columns in op.inputs:
+                if table in indexes and columns and columns not in indexes[table]:
+                    indexes[table].append(columns)
+    for plan in plans:
+        for op in plan.ops:
+            if not (op.hoisted or op.partition):
+                continue
+            # The join columns lead and the other columns make the index
+            # covering, so a probe never reads the table
+            names = [column.split()[0] for column in op.columns]
+            op.indexes = []
+            for columns in indexes[op.table]:  # type: ignore
+                covering = columns + [name for name in names if name not in columns]
+                if covering not in op.indexes:
+                    op.indexes.append(covering)
+
+
+class RuleEvaluator:
+    def __init__(
+        self,
+        conn: ConnectionProfiler,
+        rule: Rule,
+        scratch: ScratchTables,
+        plan: RulePlan | None = None,
+        kept: set[str] | None = None,
+    ) -> None:
+        self.conn = conn
+        self.rule = rule
+        # Every statement carries the rule, serialized once
+        self.rule_str = rule.serialize()
+        self.scratch = scratch
+        # Without a plan, the rule is planned on its first step
+        self.plan = plan
+        # Hoisted tables and partitions that are already filled. Without it,
+        # their ops are evaluated like the others.
+        self.kept = kept
+        self.temp_tables: list[str] = []
+
+    def execute(self, tag: Tag, stmt: str) -> Any:
+        return self.conn.execute(tag, stmt, self.rule_str)
+
+    def execute_batch(self, tag: Tag, stmts: list[str]):
+        self.conn.execute_batch(tag, stmts, self.rule_str)
+
+    def step(self):
+        with self.conn.span("rule", rule=self.rule_str):
+            if self.plan is None:
+                self.plan = plan_rule(self.rule)
+                self.conn.save_point(Tag.PY_STACK, self.plan.stack_ns, self.rule_str)
+                self.conn.save_point(Tag.PY_RENDER, self.plan.render_ns, self.rule_str)
+            self.evaluate(self.plan)
+
+    def fill(self, op: PlannedOp):
+        sql_str = self.scratch.create(op.table, op.columns)  # type: ignore
+        if sql_str:
+            self.execute(op.tag, sql_str)  # type: ignore
+            self.conn.commit()
+        self.execute(op.tag, f"INSERT INTO {op.table} {op.sql}")  # type: ignore
+
+    def evaluate(self, plan: RulePlan):
+        for op in plan.ops:
+            with self.conn.span(op.name):
+                if op.tag is None:
+                    continue
+                if op.table is None:
+                    self.execute(op.tag, op.sql)
+                    self.conn.commit()
+                    continue
+                if (op.hoisted or op.partition) and self.kept is not None:
+                    if op.table not in self.kept:
+                        self.fill(op)
+                        for idx, columns in enumerate(op.indexes):
+                            sql_str = self.scratch.index(op.table, idx, columns)
+                            if sql_str:
+                                self.execute(Tag.SPJ_INDEX, sql_str)
+                        self.conn.commit()
+                        self.kept.add(op.table)
+                    continue
+                self.fill(op)
+                self.temp_tables.append(op.table)
+        with self.conn.span("Clear"):
+            # Drop or truncate temporary tables
+            clear_sql = [
+                self.scratch.release(table_name)
+                for table_name in set(self.temp_tables)
+            ]
+            self.execute_batch(Tag.SPJ_CLEAR, clear_sql)
+            self.conn.commit(CommitScope.RULE)
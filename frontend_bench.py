@@ -0,0 +1,133 @@
+import argparse
+import json
+import random
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from benchmark import environment, summarize
+from datalog import Program, Rule
+from delta_program import make_delta_program
+from dependency_graph import sort_program
+from helpers import split_program
+from stack import Stack
+
+
+def random_program(
+    relations: int,
+    rules: int,
+    body_width: int,
+    arity: int = 2,
+    edb_fraction: float = 0.3,
+    constant_rate: float = 0.1,
+    seed: int = 0,
+) -> Program:
+    # Bodies are chains where each atom shares a variable with the previous
+    # one, so every rule joins. Heads only use body variables. Relations are
+    # named R<i>, which keeps clear of the delta prefix.
+    rng = random.Random(seed)
+    names = [f"R{i}" for i in range(relations)]
+    edb_count = max(1, round(relations * edb_fraction))
+    idb = names[edb_count:] or names
+    generated: list[Rule] = []
+    for _ in range(rules):
+        width = rng.randint(1, body_width)
+        body: list[tuple[str, list[Any]]] = []
+        variables: list[str] = []
+        link = "?v0"
+        for j in range(width):
+            terms: list[Any] = [link]
+            for k in range(1, arity):
+                if rng.random() < constant_rate:
+                    terms.append(rng.randrange(10))
+                else:
+                    terms.append(f"?v{j}_{k}")
+            variables.extend(term for term in terms if isinstance(term, str))
+            body.append((rng.choice(names), terms))
+            last = [term for term in terms[1:] if isinstance(term, str)]
+            link = last[-1] if last else link
+        head = [rng.choice(variables) for _ in range(arity)]
+        generated.append(Rule.create(rng.choice(idb), head, body))
+    return Program(generated)
+
+
+def stages(program: Program) -> dict[str, Callable[[], Any]]:
+    # Each stage gets its input prepared up front so it is timed in isolation
+    rules = list(program)
+    delta_program = make_delta_program(program, True)
+    nonrecursive, _ = split_program(delta_program)
+    return {
+        "program_init": lambda: Program(list(rules)),
+        "make_delta_program": lambda: make_delta_program(program, True),
+        "split_program": lambda: split_program(delta_program),
+        "sort_program": lambda: sort_program(nonrecursive),
+        "stack": lambda: [Stack(rule) for rule in delta_program],
+    }
+
+
+def measure(stage: Callable[[], Any], repetitions: int) -> dict[str, Any]:
+    samples: list[int] = []
+    for _ in range(repetitions):
+        t1 = time.perf_counter_ns()
+        stage()
+        t2 = time.perf_counter_ns()
+        samples.append(t2 - t1)
+    # Memory is traced in a separate run, tracing slows the stage down
+    tracemalloc.start()
+    stage()
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "samples_ns": samples,
+        "summary_ns": summarize(samples),
+        "peak_bytes": peak_bytes,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compiler frontend benchmarks")
+    parser.add_argument("--rules", nargs="+", type=int, default=[100, 1000, 5000])
+    parser.add_argument(
+        "--relations",
+        type=float,
+        default=0.2,
+        help="relations per rule",
+    )
+    parser.add_argument("--body-width", type=int, default=4)
+    parser.add_argument("--arity", type=int, default=2)
+    parser.add_argument("--edb-fraction", type=float, default=0.3)
+    parser.add_argument("--constant-rate", type=float, default=0.1)
+    parser.add_argument("--repetitions", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="frontend_results.json")
+    args = parser.parse_args()
+
+    results: list[dict[str, Any]] = []
+    for rules in args.rules:
+        program = random_program(
+            max(2, round(rules * args.relations)),
+            rules,
+            args.body_width,
+            args.arity,
+            args.edb_fraction,
+            args.constant_rate,
+            args.seed,
+        )
+        for name, stage in stages(program).items():
+            result = measure(stage, args.repetitions)
+            print(
+                f"{rules:>7} rules {name:>20} "
+                f"median {result['summary_ns']['median'] / 1e6:>10.2f} ms "
+                f"peak {result['peak_bytes'] / 2**20:>8.2f} MiB"
+            )
+            results.append({"rules": rules, "stage": name, **result})
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {"environment": environment(), "config": vars(args), "results": results},
+            f,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import math
+import random
+from typing import Callable
+
+type Edge = tuple[int, int]  # type: ignore
+# (nodes, edges, seed) -> directed edges without duplicates or self loops.
+# Structural shapes are fixed by the node count and ignore edges and seed.
+type Generator = Callable[[int, int, int], list[Edge]]  # type: ignore
+
+
+def max_edges(nodes: int) -> int:
+    return nodes * (nodes - 1)
+
+
+def erdos_renyi(nodes: int, edges: int, seed: int) -> list[Edge]:
+    # Uniformly random edges, the G(n, m) model
+    rng = random.Random(seed)
+    edges = min(edges, max_edges(nodes))
+    found: dict[Edge, None] = {}
+    while len(found) < edges:
+        src = rng.randrange(nodes)
+        dst = rng.randrange(nodes)
+        if src != dst:
+            found[(src, dst)] = None
+    return list(found)
+
+
+def power_law(nodes: int, edges: int, seed: int) -> list[Edge]:
+    # Preferential attachment: targets are drawn proportionally to their
+    # degree plus one, which gives a power-law in-degree distribution
+    rng = random.Random(seed)
+    edges = min(edges, max_edges(nodes))
+    targets = list(range(nodes))
+    found: dict[Edge, None] = {}
+    while len(found) < edges:
+        src = rng.randrange(nodes)
+        dst = rng.choice(targets)
+        if src != dst and (src, dst) not in found:
+            found[(src, dst)] = None
+            targets.append(dst)
+    return list(found)
+
+
+def chain(nodes: int, edges: int = 0, seed: int = 0) -> list[Edge]:
+    return [(i, i + 1) for i in range(nodes - 1)]
+
+
+def cycle(nodes: int, edges: int = 0, seed: int = 0) -> list[Edge]:
+    return [(i, (i + 1) % nodes) for i in range(nodes)] if nodes > 1 else []
+
+
+def tree(nodes: int, edges: int = 0, seed: int = 0, branching: int = 2) -> list[Edge]:
+    return [((i - 1) // branching, i) for i in range(1, nodes)]
+
+
+def grid(nodes: int, edges: int = 0, seed: int = 0) -> list[Edge]:
+    # Square grid with edges pointing right and down
+    side = math.isqrt(nodes)
+    found: list[Edge] = []
+    for row in range(side):
+        for col in range(side):
+            node = row * side + col
+            if col + 1 < side:
+                found.append((node, node + 1))
+            if row + 1 < side:
+                found.append((node, node + side))
+    return found
+
+
+GENERATORS: dict[str, Generator] = {
+    "erdos_renyi": erdos_renyi,
+    "power_law": power_law,
+    "chain": chain,
+    "cycle": cycle,
+    "tree": tree,
+    "grid": grid,
+}
@@ -1,9 +1,11 @@
-from copy import deepcopy
+from datalog import Program, Rule, Symbol
 
-from datalog import Program, Rule
 
-
-def split_program(program: Program) -> tuple[Program, Program]:
+def split_program(
+    program: Program, changing: set[Symbol] | None = None
+) -> tuple[Program, Program]:
+    # A rule is recursive when it reads a relation that changes while the
+    # recursive rules run. Without changing, that is only its own head.
     nonrecursive: list[Rule] = []
     recursive: list[Rule] = []
 
@@ -12,11 +14,14 @@ def split_program(program: Program) -> tuple[Program, Program]:
         is_recursive = False
 
         for body_atom in rule.body:
-            if body_atom.symbol == head_symbol:
+            if changing is None:
+                if body_atom.symbol == head_symbol:
+                    is_recursive = True
+            elif body_atom.symbol in changing:
                 is_recursive = True
 
         if is_recursive:
-            recursive.append(deepcopy(rule))
+            recursive.append(rule)
         else:
-            nonrecursive.append(deepcopy(rule))
+            nonrecursive.append(rule)
     return Program(nonrecursive), Program(recursive)
@@ -0,0 +1,181 @@
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Any
+
+from sqlalchemy import text
+
+from benchmark import (
+    Backend,
+    bulk_insert,
+    distinct,
+    environment,
+    read_lines,
+    summarize,
+    transitive_closure,
+)
+from compiler import Compiler
+from generators import GENERATORS
+
+# Workloads over the E relation that can be split into base and batches
+EDGE_FILES: dict[str, str] = {
+    "dense": "test/data/dense.txt",
+    "sparse": "test/data/sparse.txt",
+}
+
+
+def poll(backend: Backend, test_run: int) -> tuple[int, int]:
+    # Compiler closes its connection after polling, so every poll gets its own
+    compiler = Compiler(
+        backend.db_type, backend.db_data, transitive_closure(), test_run
+    )
+    t1 = time.perf_counter_ns()
+    compiler.poll()
+    t2 = time.perf_counter_ns()
+    compiler.close()
+    return t2 - t1, compiler.conn.iter + 1
+
+
+def fetch_facts(backend: Backend, table: str) -> list[tuple[int, ...]]:
+    # Sorted, so that the same facts compare equal whatever order they came in
+    engine, conn = backend.connect()
+    facts = sorted(tuple(row) for row in conn.execute(text(f"SELECT * FROM {table}")))
+    conn.close()
+    engine.dispose()
+    return facts
+
+
+def split_batches(
+    edges: list[tuple[int, int]], batch_size: int, batches: int, seed: int
+) -> tuple[list[tuple[int, int]], list[list[tuple[int, int]]]]:
+    # Holds out batches * batch_size random edges, the rest is the base
+    held_out = random.Random(seed).sample(edges, min(len(edges), batch_size * batches))
+    held_out_set = set(held_out)
+    base = [edge for edge in edges if edge not in held_out_set]
+    return base, [
+        held_out[i : i + batch_size] for i in range(0, len(held_out), batch_size)
+    ]
+
+
+def run_incremental(
+    backend: Backend,
+    edges: list[tuple[int, int]],
+    batch_size: int,
+    batches: int,
+    recompute_repetitions: int,
+    seed: int,
+) -> dict[str, Any]:
+    base, held_out = split_batches(edges, batch_size, batches, seed)
+    backend.load_edges(base)
+    base_ns, _ = poll(backend, 0)
+
+    # Latency covers inserting the batch and polling it into T
+    batch_results: list[dict[str, Any]] = []
+    for i, batch in enumerate(held_out, 1):
+        t1 = time.perf_counter_ns()
+        engine, conn = backend.connect()
+        bulk_insert(conn, "E", batch)
+        conn.commit()
+        conn.close()
+        engine.dispose()
+        t2 = time.perf_counter_ns()
+        poll_ns, iterations = poll(backend, i)
+        batch_results.append(
+            {
+                "facts": len(batch),
+                "insert_ns": t2 - t1,
+                "poll_ns": poll_ns,
+                "latency_ns": t2 - t1 + poll_ns,
+                "iterations": iterations,
+            }
+        )
+    incremental_facts = fetch_facts(backend, "T")
+
+    # Full recomputation of the final state, the reference every batch is
+    # compared against
+    recompute: list[int] = []
+    for i in range(recompute_repetitions):
+        backend.load_edges(base + [edge for batch in held_out for edge in batch])
+        elapsed_ns, _ = poll(backend, i)
+        recompute.append(elapsed_ns)
+    recompute_facts = fetch_facts(backend, "T")
+
+    latencies = [result["latency_ns"] for result in batch_results]
+    return {
+        "base_facts": len(base),
+        "base_poll_ns": base_ns,
+        "batch_size": batch_size,
+        "batches": batch_results,
+        "latency_summary_ns": summarize(latencies),
+        "recompute_samples_ns": recompute,
+        "recompute_summary_ns": summarize(recompute),
+        "speedup": statistics.median(recompute) / statistics.median(latencies),
+        "derived_facts": len(incremental_facts),
+        # Both paths must agree on the materialized relation, fact for fact
+        "consistent": incremental_facts == recompute_facts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Incremental update latency")
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "duckdb"])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--workload", choices=list(EDGE_FILES), default="dense")
+    source.add_argument("--graph", choices=list(GENERATORS))
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--edge-factor", type=float, default=1.5)
+    parser.add_argument("--batch-size", nargs="+", type=int, default=[1, 10, 100])
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--recompute-repetitions", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default="test/data")
+    parser.add_argument("--output", default="incremental_results.json")
+    args = parser.parse_args()
+
+    if args.graph:
+        edges = list(
+            distinct(
+                GENERATORS[args.graph](
+                    args.nodes, round(args.nodes * args.edge_factor), args.seed
+                )
+            )
+        )
+    else:
+        lines = read_lines(EDGE_FILES[args.workload], 1)
+        edges = list(distinct(tuple(map(int, line.split()[:2])) for line in lines))
+
+    backend = Backend(args.backend, args.data_dir, snapshots=False)
+    results: list[dict[str, Any]] = []
+    for batch_size in args.batch_size:
+        result = run_incremental(
+            backend,
+            edges,
+            batch_size,
+            args.batches,
+            args.recompute_repetitions,
+            args.seed,
+        )
+        latency = result["latency_summary_ns"]
+        recompute = result["recompute_summary_ns"]
+        print(
+            f"batch {batch_size:>6} "
+            f"latency median {latency['median'] / 1e6:.1f} ms "
+            f"p95 {latency['p95'] / 1e6:.1f} ms, "
+            f"recompute median {recompute['median'] / 1e6:.1f} ms, "
+            f"speedup {result['speedup']:.2f}x"
+            + ("" if result["consistent"] else ", INCONSISTENT")
+        )
+        results.append(result)
+    backend.reset(transitive_closure())
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {"environment": environment(), "config": vars(args), "results": results},
+            f,
+        )
+
+
+if __name__ == "__main__":
+    main()
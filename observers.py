@@ -0,0 +1,138 @@
+import os
+import time
+from collections import defaultdict
+
+from sinks import StatementRecord
+
+
+class CompilerObserver:
+    # Hooks fired by Compiler while it evaluates. Override the ones needed.
+
+    def on_poll_start(self, test_run: int):
+        pass
+
+    def on_poll_end(self, test_run: int, elapsed_ns: int):
+        pass
+
+    def on_stratum_start(self, stratum: str, iter: int):
+        pass
+
+    def on_stratum_end(self, stratum: str, iter: int, elapsed_ns: int):
+        pass
+
+    def on_iteration_end(
+        self, iter: int, delta_sizes: dict[str, int], elapsed_ns: int
+    ):
+        pass
+
+    def on_statement(self, record: StatementRecord):
+        pass
+
+
+class PrometheusObserver(CompilerObserver):
+    # Writes metrics in the Prometheus text format after every iteration,
+    # stratum and poll. The file is replaced atomically so a scraper never
+    # reads a partial write.
+    def __init__(self, path: str, prefix: str = "pyterry") -> None:
+        self.path = path
+        self.prefix = prefix
+        self.test_run = 0
+        self.running = 0
+        self.iter = -1
+        self.stratum = ""
+        self.poll_start_ns = 0
+        self.iterations = 0
+        self.facts = 0
+        self.pending_facts = 0
+        self.last_iteration_ns = 0
+        self.last_progress_s = 0.0
+        self.relation_facts: dict[str, int] = defaultdict(int)
+        self.statements: dict[str, int] = defaultdict(int)
+        self.statement_ns: dict[str, int] = defaultdict(int)
+
+    def on_poll_start(self, test_run: int):
+        self.test_run = test_run
+        self.running = 1
+        self.poll_start_ns = time.perf_counter_ns()
+        self.touch()
+
+    def on_poll_end(self, test_run: int, elapsed_ns: int):
+        self.running = 0
+        self.touch()
+
+    def on_stratum_start(self, stratum: str, iter: int):
+        self.stratum = stratum
+        self.touch()
+
+    def on_stratum_end(self, stratum: str, iter: int, elapsed_ns: int):
+        self.touch()
+
+    def on_iteration_end(
+        self, iter: int, delta_sizes: dict[str, int], elapsed_ns: int
+    ):
+        self.iter = iter
+        self.iterations += 1
+        self.last_iteration_ns = elapsed_ns
+        # Facts found in this iteration are the delta of the next one
+        self.pending_facts = sum(delta_sizes.values())
+        self.facts += self.pending_facts
+        for relation, new_facts in delta_sizes.items():
+            self.relation_facts[relation] += new_facts
+        self.touch()
+
+    def on_statement(self, record: StatementRecord):
+        # Only aggregated here, the file is written at the coarser hooks
+        _, _, tag, elapsed_ns, _, _, _ = record
+        self.statements[tag] += 1
+        self.statement_ns[tag] += elapsed_ns
+
+    def touch(self):
+        self.last_progress_s = time.time()
+        self.write()
+
+    def metrics(self) -> str:
+        p = self.prefix
+        elapsed_s = (time.perf_counter_ns() - self.poll_start_ns) / 1e9
+        rate = 1 / elapsed_s if self.poll_start_ns and elapsed_s > 0 else 0.0
+        lines = [
+            f"# TYPE {p}_poll_running gauge",
+            f"{p}_poll_running {self.running}",
+            f"# TYPE {p}_test_run gauge",
+            f"{p}_test_run {self.test_run}",
+            f"# TYPE {p}_iteration gauge",
+            f'{p}_iteration{{stratum="{self.stratum}"}} {self.iter}',
+            f"# TYPE {p}_iterations_total counter",
+            f"{p}_iterations_total {self.iterations}",
+            f"# TYPE {p}_iterations_per_second gauge",
+            f"{p}_iterations_per_second {self.iterations * rate}",
+            f"# TYPE {p}_last_iteration_seconds gauge",
+            f"{p}_last_iteration_seconds {self.last_iteration_ns / 1e9}",
+            f"# TYPE {p}_facts_derived_total counter",
+            f"{p}_facts_derived_total {self.facts}",
+            f"# TYPE {p}_facts_per_second gauge",
+            f"{p}_facts_per_second {self.facts * rate}",
+            f"# TYPE {p}_pending_delta_facts gauge",
+            f"{p}_pending_delta_facts {self.pending_facts}",
+            f"# TYPE {p}_last_progress_timestamp_seconds gauge",
+            f"{p}_last_progress_timestamp_seconds {self.last_progress_s}",
+            f"# TYPE {p}_relation_facts_derived_total counter",
+        ]
+        for relation, facts in sorted(self.relation_facts.items()):
+            lines.append(
+                f'{p}_relation_facts_derived_total{{relation="{relation}"}} {facts}'
+            )
+        lines.append(f"# TYPE {p}_statements_total counter")
+        for tag, count in sorted(self.statements.items()):
+            lines.append(f'{p}_statements_total{{tag="{tag}"}} {count}')
+        lines.append(f"# TYPE {p}_statement_seconds_total counter")
+        for tag, elapsed_ns in sorted(self.statement_ns.items()):
+            lines.append(
+                f'{p}_statement_seconds_total{{tag="{tag}"}} {elapsed_ns / 1e9}'
+            )
+        return "\n".join(lines) + "\n"
+
+    def write(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.metrics())
+        os.replace(tmp_path, self.path)
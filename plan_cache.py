@@ -0,0 +1,125 @@
+import functools
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+from dataclasses import dataclass
+
+from datalog import Program, Rule, Symbol, Term, TermConstant, TermVariable
+from delta_program import DELTA_PREFIX, make_delta_program, make_old_new_program
+from dependency_graph import changing_relations, sort_program
+from evaluator import RulePlan, plan_kept_tables, plan_rule
+from helpers import split_program
+
+# Modules whose code decides what a compiled program looks like. Their source
+# is part of every fingerprint, so editing them invalidates cached plans.
+FRONTEND_MODULES: list[str] = [
+    "datalog",
+    "delta_program",
+    "helpers",
+    "dependency_graph",
+    "stack",
+    "evaluator",
+    "plan_cache",
+]
+
+
+@dataclass
+class CompiledProgram:
+    nonrecursive: Program
+    recursive: Program
+    rule_plans: dict[Rule, RulePlan]
+
+
+def compile_program(program: Program) -> CompiledProgram:
+    # Variants reading the delta of a relation that changes during the
+    # fixpoint run every iteration, the others once per poll
+    changing = changing_relations(program)
+    nonrecursive, recursive = split_program(
+        make_delta_program(program, True),
+        {Symbol(f"{DELTA_PREFIX}{relation}") for relation in changing},
+    )
+    nonrecursive = sort_program(nonrecursive)
+    recursive = make_old_new_program(recursive, changing)
+    rule_plans = {rule: plan_rule(rule) for rule in [*nonrecursive, *recursive]}
+    plan_kept_tables([rule_plans[rule] for rule in recursive], changing)
+    return CompiledProgram(nonrecursive, recursive, rule_plans)
+
+
+@functools.cache
+def frontend_version() -> str:
+    digest = hashlib.sha256()
+    for name in FRONTEND_MODULES:
+        module = sys.modules.get(name) or __import__(name)
+        with open(module.__file__, "rb") as file:  # type: ignore
+            digest.update(file.read())
+    return digest.hexdigest()
+
+
+def canonical_term(term: Term) -> str:
+    # Spells out the type of every constant, independent of the serialize syntax
+    if isinstance(term, TermVariable):
+        return f"?{term.name}"
+    assert isinstance(term, TermConstant)
+    return f"{type(term.value).__name__}:{term.value!r}"
+
+
+def fingerprint(program: Program, db_type: str) -> str:
+    # Programs keep their rules sorted, so the rule order does not matter
+    digest = hashlib.sha256()
+    digest.update(f"{frontend_version()}\n{db_type}\n".encode())
+    for rule in program:
+        for atom in [rule.head, *rule.body]:
+            terms = ",".join(canonical_term(term) for term in atom.terms)
+            digest.update(f"{atom.symbol}({terms})".encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+class PlanCache:
+    # Pickled compiled programs, one file per fingerprint. Only point it at a
+    # directory you trust, loading a pickle can run arbitrary code.
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pickle")
+
+    def load(self, key: str) -> CompiledProgram | None:
+        try:
+            with open(self.path(key), "rb") as file:
+                compiled = pickle.load(file)
+        except (
+            OSError,
+            pickle.UnpicklingError,
+            EOFError,
+            AttributeError,
+            ImportError,
+            TypeError,
+            ValueError,
+        ):
+            # Missing, truncated or written by an incompatible version, whose
+            # classes or modules may have been renamed since
+            self.misses += 1
+            return None
+        self.hits += 1
+        return compiled
+
+    def store(self, key: str, compiled: CompiledProgram):
+        # Written to a temporary file first so readers never see half a plan
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as file:
+            pickle.dump(compiled, file, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, self.path(key))
+
+    def get(self, program: Program, db_type: str) -> CompiledProgram:
+        key = fingerprint(program, db_type)
+        compiled = self.load(key)
+        if compiled is None:
+            compiled = compile_program(program)
+            self.store(key, compiled)
+        return compiled
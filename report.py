@@ -0,0 +1,197 @@
+import argparse
+import json
+from collections import defaultdict
+from typing import Any
+
+from conn_profiler import Tag
+from sinks import StatementRecord
+
+# Tag whose rows_affected counts the derivations of a rule: the rows its
+# projection put into the eval table, before they are deduplicated against the
+# relation. Facts the relation already held are counted again, so these are not
+# new facts. Those are only known per relation, see Compiler.dump_convergence.
+DERIVATION_TAG: str = Tag.SPJ_PROJECT.name
+SORT_KEYS: list[str] = ["total_ns", "derivations", "ns_per_derivation"]
+
+
+class RuleCost:
+    def __init__(self, rule: str) -> None:
+        self.rule = rule
+        self.total_ns = 0
+        self.derivations = 0
+        self.statements = 0
+        self.by_tag: dict[str, int] = defaultdict(int)
+        self.by_iter: dict[int, int] = defaultdict(int)
+
+    def add(self, iter: int, tag: str, elapsed_ns: int, rows_affected: int):
+        self.total_ns += elapsed_ns
+        self.statements += 1
+        self.by_tag[tag] += elapsed_ns
+        self.by_iter[iter] += elapsed_ns
+        if tag == DERIVATION_TAG and rows_affected > 0:
+            self.derivations += rows_affected
+
+    @property
+    def ns_per_derivation(self) -> float:
+        # Rules that derived nothing are charged their full time
+        return self.total_ns / max(self.derivations, 1)
+
+    def scale(self, factor: float) -> "RuleCost":
+        scaled = RuleCost(self.rule)
+        scaled.total_ns = round(self.total_ns * factor)
+        scaled.derivations = round(self.derivations * factor)
+        scaled.statements = round(self.statements * factor)
+        for tag, elapsed_ns in self.by_tag.items():
+            scaled.by_tag[tag] = round(elapsed_ns * factor)
+        for iter, elapsed_ns in self.by_iter.items():
+            scaled.by_iter[iter] = round(elapsed_ns * factor)
+        return scaled
+
+
+def rule_costs(records: list[StatementRecord]) -> dict[str, RuleCost]:
+    # Statements without a rule (fact counts, commits, drains) are kept under ""
+    costs: dict[str, RuleCost] = {}
+    runs: set[int] = set()
+    for test_run, iter, tag, elapsed_ns, rule, rows_affected, _ in records:
+        runs.add(test_run)
+        if rule not in costs:
+            costs[rule] = RuleCost(rule)
+        costs[rule].add(iter, tag, elapsed_ns, rows_affected)
+    # Average over the runs so files with different repetitions compare
+    if len(runs) > 1:
+        costs = {rule: cost.scale(1 / len(runs)) for rule, cost in costs.items()}
+    return costs
+
+
+def rank(costs: dict[str, RuleCost], key: str = "total_ns") -> list[RuleCost]:
+    return sorted(costs.values(), key=lambda cost: getattr(cost, key), reverse=True)
+
+
+def time_by_tag(costs: dict[str, RuleCost]) -> dict[str, int]:
+    totals: dict[str, int] = defaultdict(int)
+    for cost in costs.values():
+        for tag, elapsed_ns in cost.by_tag.items():
+            totals[tag] += elapsed_ns
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def time_by_iter(costs: dict[str, RuleCost]) -> dict[int, int]:
+    totals: dict[int, int] = defaultdict(int)
+    for cost in costs.values():
+        for iter, elapsed_ns in cost.by_iter.items():
+            totals[iter] += elapsed_ns
+    return dict(sorted(totals.items()))
+
+
+# (rule, old total_ns, new total_ns, new / old)
+type Regression = tuple[str, int, int, float]  # type: ignore
+
+
+def regressions(
+    old: dict[str, RuleCost],
+    new: dict[str, RuleCost],
+    threshold: float = 0.1,
+    min_ns: int = 0,
+) -> list[Regression]:
+    # Rules that got slower by more than threshold, worst first
+    found: list[Regression] = []
+    for rule, cost in new.items():
+        if rule not in old or cost.total_ns < min_ns:
+            continue
+        old_ns = old[rule].total_ns
+        ratio = cost.total_ns / old_ns if old_ns else float("inf")
+        if ratio > 1 + threshold:
+            found.append((rule, old_ns, cost.total_ns, ratio))
+    return sorted(found, key=lambda regression: regression[3], reverse=True)
+
+
+def load_records(
+    path: str,
+    backend: str | None = None,
+    workload: str | None = None,
+    scale: float | None = None,
+) -> list[StatementRecord]:
+    # Accepts a single dump_benchmark list, a list of them, one per run, or
+    # benchmark.py output narrowed down to one backend, workload and scale
+    with open(path) as f:
+        data: Any = json.load(f)
+    if isinstance(data, dict):
+        cells = [
+            result
+            for result in data["results"]
+            if backend in (None, result["backend"])
+            and workload in (None, result["workload"])
+            and scale in (None, result["scale"])
+        ]
+        if len(cells) != 1:
+            raise ValueError(
+                f"{path} has {len(cells)} matching results, pick one with "
+                "--backend, --workload and --scale"
+            )
+        data = cells[0]["statements"]
+    if data and isinstance(data[0][0], list):
+        data = [record for run in data for record in run]
+    return [tuple(record) for record in data]
+
+
+def format_report(costs: dict[str, RuleCost], key: str, top: int) -> str:
+    lines = [f"{'total ms':>10} {'derived':>10} {'ns/derived':>10}  rule"]
+    for cost in rank(costs, key)[:top]:
+        lines.append(
+            f"{cost.total_ns / 1e6:>10.2f} {cost.derivations:>10} "
+            f"{cost.ns_per_derivation:>10.0f}  {cost.rule or '<none>'}"
+        )
+    lines.append("")
+    lines.append(f"{'total ms':>10}  tag")
+    for tag, elapsed_ns in time_by_tag(costs).items():
+        lines.append(f"{elapsed_ns / 1e6:>10.2f}  {tag}")
+    lines.append("")
+    lines.append(f"{'total ms':>10}  iter")
+    for iter, elapsed_ns in time_by_iter(costs).items():
+        lines.append(f"{elapsed_ns / 1e6:>10.2f}  {iter}")
+    return "\n".join(lines)
+
+
+def format_regressions(found: list[Regression]) -> str:
+    lines = [f"{'old ms':>10} {'new ms':>10} {'ratio':>6}  rule"]
+    for rule, old_ns, new_ns, ratio in found:
+        lines.append(
+            f"{old_ns / 1e6:>10.2f} {new_ns / 1e6:>10.2f} {ratio:>6.2f}  "
+            f"{rule or '<none>'}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-rule cost report")
+    parser.add_argument("run", help="dump_benchmark JSON output")
+    parser.add_argument("--baseline", help="earlier run to compare against")
+    parser.add_argument("--sort", choices=SORT_KEYS, default="total_ns")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--backend", help="result to pick from benchmark.py output")
+    parser.add_argument("--workload", help="result to pick from benchmark.py output")
+    parser.add_argument(
+        "--scale", type=float, help="result to pick from benchmark.py output"
+    )
+    args = parser.parse_args()
+
+    try:
+        new_records = load_records(args.run, args.backend, args.workload, args.scale)
+        old_records = (
+            load_records(args.baseline, args.backend, args.workload, args.scale)
+            if args.baseline
+            else []
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    costs = rule_costs(new_records)
+    print(format_report(costs, args.sort, args.top))
+    if args.baseline:
+        old = rule_costs(old_records)
+        print()
+        print(format_regressions(regressions(old, costs, args.threshold)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+from enum import Enum, auto
+
+
+class ScratchMode(Enum):
+    # Create scratch tables when needed and drop them when done
+    DROP = auto()
+    # Keep scratch tables for the whole connection and truncate them instead
+    TRUNCATE = auto()
+
+
+# Scratch tables are private to the compiler's connection, so they can skip
+# WAL/redo logging wherever the backend offers session-local tables.
+# MySQL temporary tables cannot be opened twice in one statement, which breaks
+# self joins of selections, and Materialize has no temporary storage, so both
+# keep ordinary tables.
+TABLE_KIND: dict[str, str] = {
+    "sqlite": "TEMPORARY ",
+    "duckdb": "TEMPORARY ",
+    "postgres": "TEMPORARY ",
+}
+
+# Backends whose joins probe indexes. DuckDB and Materialize plan their own
+# join structures, and MySQL has no CREATE INDEX IF NOT EXISTS for scratch
+# tables that outlive the compiler.
+INDEXED: set[str] = {"sqlite", "postgres"}
+
+
+class ScratchTables:
+    def __init__(self, db_type: str, mode: ScratchMode = ScratchMode.DROP) -> None:
+        self.db_type = db_type
+        self.mode = mode
+        self.table_kind = TABLE_KIND.get(db_type, "")
+        self.tables: set[str] = set()
+
+    def create(self, table_name: str, col_list: list[str]) -> str | None:
+        if self.mode == ScratchMode.TRUNCATE and table_name in self.tables:
+            return None
+        self.tables.add(table_name)
+        return (
+            f"CREATE {self.table_kind}TABLE IF NOT EXISTS {table_name} "
+            f"({', '.join(col_list)})"
+        )
+
+    def index(self, table_name: str, idx: int, col_list: list[str]) -> str | None:
+        if self.db_type not in INDEXED:
+            return None
+        return (
+            f"CREATE INDEX IF NOT EXISTS {table_name}_idx{idx} "
+            f"ON {table_name} ({', '.join(col_list)})"
+        )
+
+    def truncate(self, table_name: str) -> str:
+        if self.db_type in ("sqlite", "materialize"):
+            return f"DELETE FROM {table_name}"
+        return f"TRUNCATE TABLE {table_name}"
+
+    def release(self, table_name: str) -> str:
+        if self.mode == ScratchMode.TRUNCATE:
+            return self.truncate(table_name)
+        self.tables.discard(table_name)
+        return f"DROP TABLE {table_name}"
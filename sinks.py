@@ -0,0 +1,245 @@
+import csv
+import json
+import sqlite3
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Any, Iterable
+
+# (test_run, iter, tag, elapsed_ns, rule, rows_affected, rows_returned)
+type StatementRecord = tuple[int, int, str, int, str, int, int]  # type: ignore
+# StatementRecord with the tag and rule replaced by their interned ids
+type CompactRecord = tuple[int, int, int, int, int, int, int]  # type: ignore
+
+STATEMENT_COLUMNS: list[str] = [
+    "test_run",
+    "iter",
+    "tag",
+    "elapsed_ns",
+    "rule",
+    "rows_affected",
+    "rows_returned",
+]
+
+
+class Interner:
+    def __init__(self) -> None:
+        self.ids: dict[str, int] = {}
+        self.values: list[str] = []
+
+    def intern(self, value: str) -> tuple[int, bool]:
+        # Returns the id of value and whether it was seen for the first time
+        value_id = self.ids.get(value)
+        if value_id is not None:
+            return value_id, False
+        value_id = len(self.values)
+        self.ids[value] = value_id
+        self.values.append(value)
+        return value_id, True
+
+
+class StatementSink(ABC):
+    def __init__(self, buffer_size: int = 1024) -> None:
+        self.tags = Interner()
+        self.rules = Interner()
+        self.buffer_size = buffer_size
+        self.buffer: list[CompactRecord] = []
+
+    def write(self, record: StatementRecord):
+        test_run, iter, tag, elapsed_ns, rule, rows_affected, rows_returned = record
+        tag_id, new_tag = self.tags.intern(tag)
+        if new_tag:
+            self.write_id("tag", tag_id, tag)
+        rule_id, new_rule = self.rules.intern(rule)
+        if new_rule:
+            self.write_id("rule", rule_id, rule)
+        self.buffer.append(
+            (test_run, iter, tag_id, elapsed_ns, rule_id, rows_affected, rows_returned)
+        )
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def write_id(self, kind: str, value_id: int, value: str):
+        pass
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+    @abstractmethod
+    def records(self) -> list[StatementRecord]:
+        pass
+
+
+def expand(
+    records: Iterable[CompactRecord], tags: list[str], rules: list[str]
+) -> list[StatementRecord]:
+    return [
+        (test_run, iter, tags[tag_id], elapsed_ns, rules[rule_id], affected, returned)
+        for test_run, iter, tag_id, elapsed_ns, rule_id, affected, returned in records
+    ]
+
+
+class MemorySink(StatementSink):
+    # Keeps the most recent max_records statements, or all when unset
+    def __init__(self, max_records: int | None = None) -> None:
+        super().__init__(buffer_size=1)
+        self.compact_records: deque[CompactRecord] = deque(maxlen=max_records)
+
+    def flush(self):
+        self.compact_records.extend(self.buffer)
+        self.buffer.clear()
+
+    def records(self) -> list[StatementRecord]:
+        self.flush()
+        return expand(self.compact_records, self.tags.values, self.rules.values)
+
+
+class JsonlSink(StatementSink):
+    # Writes one JSON object per line: ids for tags and rules the first time
+    # they appear, then statements referring to them
+    def __init__(self, path: str, buffer_size: int = 1024) -> None:
+        super().__init__(buffer_size)
+        self.path = path
+        self.file = open(path, "w")
+
+    def write_id(self, kind: str, value_id: int, value: str):
+        self.file.write(json.dumps({"kind": kind, "id": value_id, "value": value}))
+        self.file.write("\n")
+
+    def flush(self):
+        for record in self.buffer:
+            self.file.write(json.dumps(dict(zip(STATEMENT_COLUMNS, record))))
+            self.file.write("\n")
+        self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+
+    def records(self) -> list[StatementRecord]:
+        if not self.file.closed:
+            self.flush()
+        return read_jsonl(self.path)
+
+
+def read_jsonl(path: str) -> list[StatementRecord]:
+    ids: dict[str, dict[int, str]] = {"tag": {}, "rule": {}}
+    records: list[StatementRecord] = []
+    with open(path) as f:
+        for line in f:
+            entry: dict[str, Any] = json.loads(line)
+            if "kind" in entry:
+                ids[entry["kind"]][entry["id"]] = entry["value"]
+                continue
+            entry["tag"] = ids["tag"][entry["tag"]]
+            entry["rule"] = ids["rule"][entry["rule"]]
+            records.append(tuple(entry[column] for column in STATEMENT_COLUMNS))
+    return records
+
+
+class CsvSink(StatementSink):
+    # Writes statements to path and the tag and rule ids to path.ids.csv
+    def __init__(self, path: str, buffer_size: int = 1024) -> None:
+        super().__init__(buffer_size)
+        self.path = path
+        self.file = open(path, "w", newline="")
+        self.ids_file = open(f"{path}.ids.csv", "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.ids_writer = csv.writer(self.ids_file)
+        self.writer.writerow(STATEMENT_COLUMNS)
+        self.ids_writer.writerow(["kind", "id", "value"])
+
+    def write_id(self, kind: str, value_id: int, value: str):
+        self.ids_writer.writerow([kind, value_id, value])
+
+    def flush(self):
+        self.writer.writerows(self.buffer)
+        self.buffer.clear()
+        self.file.flush()
+        self.ids_file.flush()
+
+    def close(self):
+        super().close()
+        self.file.close()
+        self.ids_file.close()
+
+    def records(self) -> list[StatementRecord]:
+        if not self.file.closed:
+            self.flush()
+        return read_csv(self.path)
+
+
+def read_csv(path: str) -> list[StatementRecord]:
+    ids: dict[str, list[str]] = {"tag": [], "rule": []}
+    with open(f"{path}.ids.csv", newline="") as f:
+        for kind, _, value in list(csv.reader(f))[1:]:
+            ids[kind].append(value)
+    with open(path, newline="") as f:
+        rows = list(csv.reader(f))[1:]
+    compact: list[CompactRecord] = [tuple(int(col) for col in row) for row in rows]
+    return expand(compact, ids["tag"], ids["rule"])
+
+
+class SqliteSink(StatementSink):
+    def __init__(self, path: str, buffer_size: int = 1024) -> None:
+        super().__init__(buffer_size)
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS tags (id INTEGER PRIMARY KEY, name TEXT);
+            CREATE TABLE IF NOT EXISTS rules (id INTEGER PRIMARY KEY, rule TEXT);
+            CREATE TABLE IF NOT EXISTS statements (
+                test_run INTEGER,
+                iter INTEGER,
+                tag INTEGER,
+                elapsed_ns INTEGER,
+                rule INTEGER,
+                rows_affected INTEGER,
+                rows_returned INTEGER
+            );
+            DELETE FROM tags;
+            DELETE FROM rules;
+            DELETE FROM statements;
+            """
+        )
+        self.closed = False
+
+    def write_id(self, kind: str, value_id: int, value: str):
+        table = "tags" if kind == "tag" else "rules"
+        self.conn.execute(f"INSERT INTO {table} VALUES (?, ?)", (value_id, value))
+
+    def flush(self):
+        self.conn.executemany(
+            "INSERT INTO statements VALUES (?, ?, ?, ?, ?, ?, ?)", self.buffer
+        )
+        self.buffer.clear()
+        self.conn.commit()
+
+    def close(self):
+        super().close()
+        self.conn.close()
+        self.closed = True
+
+    def records(self) -> list[StatementRecord]:
+        if not self.closed:
+            self.flush()
+        return read_sqlite(self.path)
+
+
+def read_sqlite(path: str) -> list[StatementRecord]:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(
+            """SELECT s.test_run, s.iter, t.name, s.elapsed_ns, r.rule,
+                    s.rows_affected, s.rows_returned
+                FROM statements AS s
+                JOIN tags AS t ON s.tag = t.id
+                JOIN rules AS r ON s.rule = r.id
+                ORDER BY s.rowid"""
+        ).fetchall()
+    finally:
+        conn.close()
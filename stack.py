@@ -1,6 +1,6 @@
 import functools
-from copy import deepcopy
 from dataclasses import dataclass
+from typing import Sequence
 
 from datalog import Rule, Symbol, Term, TermConstant, TermVariable, TypedValue, Variable
 
@@ -65,10 +65,9 @@ def stringify_select(selection: Select) -> Symbol:
 
 class Stack(list[Instruction]):
     def __init__(self, rule: Rule):
-        rule = deepcopy(rule)
         i = 0
         last_join_result_name: Symbol = Symbol("")
-        last_join_terms: list[Term] = []
+        last_join_terms: Sequence[Term] = []
         while i < len(rule.body):
             current_atom = rule.body[i]
             if i + 1 < len(rule.body):
@@ -98,8 +97,7 @@ class Stack(list[Instruction]):
                 )
                 if binary_join:
                     last_join_result_name = stringify_join(binary_join)
-                    last_join_terms = left_terms
-                    last_join_terms.extend(right_terms)
+                    last_join_terms = [*left_terms, *right_terms]
                     self.append(binary_join)
             else:  # no next atom
                 if not self:
@@ -109,7 +107,7 @@ class Stack(list[Instruction]):
                 self.append(projection)
             i += 1
 
-    def get_selection(self, symbol: Symbol, terms: list[Term]) -> Select | None:
+    def get_selection(self, symbol: Symbol, terms: Sequence[Term]) -> Select | None:
         selection: list[Select] = []
         for idx, t in enumerate(terms):
             if isinstance(t, TermConstant):
@@ -119,7 +117,7 @@ class Stack(list[Instruction]):
         else:
             return None
 
-    def get_variables(self, terms: list[Term]) -> dict[str, int]:
+    def get_variables(self, terms: Sequence[Term]) -> dict[str, int]:
         variables = {}
         for idx, t in enumerate(terms):
             if isinstance(t, TermVariable):
@@ -128,8 +126,8 @@ class Stack(list[Instruction]):
 
     def get_join(
         self,
-        left_terms: list[Term],
-        right_terms: list[Term],
+        left_terms: Sequence[Term],
+        right_terms: Sequence[Term],
         left_symbol: Symbol,
         right_symbol: Symbol,
     ) -> Join | None:
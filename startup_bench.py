@@ -0,0 +1,106 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Any
+
+from benchmark import environment, summarize
+
+# Median import time budgets in milliseconds, each measured in a fresh
+# interpreter. About twice what they take on a slow machine, which still
+# catches a heavy library moving back into module scope.
+BUDGETS_MS: dict[str, float] = {
+    "datalog": 50,
+    "datalog_parser": 60,
+    "dependency_graph": 60,
+    "report": 100,
+    "plan_cache": 200,
+    "compiler": 200,
+}
+# Libraries that are only imported once they are needed
+HEAVY_MODULES: list[str] = ["sqlalchemy", "sqlglot", "networkx"]
+ROOT: str = os.path.dirname(os.path.abspath(__file__))
+
+
+def measure_import(module: str) -> tuple[int, int, list[str]]:
+    # Returns the import time, the time of the whole process, both in ns, and
+    # the heavy modules the import loaded
+    code = (
+        "import sys, time\n"
+        "t1 = time.perf_counter_ns()\n"
+        f"import {module}\n"
+        "t2 = time.perf_counter_ns()\n"
+        "print(t2 - t1)\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    t1 = time.perf_counter_ns()
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=ROOT,
+    )
+    t2 = time.perf_counter_ns()
+    import_ns, loaded = result.stdout.splitlines()
+    return int(import_ns), t2 - t1, [name for name in loaded.split(",") if name]
+
+
+def run_module(module: str, repetitions: int) -> dict[str, Any]:
+    import_samples: list[int] = []
+    process_samples: list[int] = []
+    loaded: list[str] = []
+    for _ in range(repetitions):
+        import_ns, process_ns, loaded = measure_import(module)
+        import_samples.append(import_ns)
+        process_samples.append(process_ns)
+    import_summary = summarize(import_samples)
+    return {
+        "module": module,
+        "import_samples_ns": import_samples,
+        "import_summary_ns": import_summary,
+        "process_summary_ns": summarize(process_samples),
+        "heavy_modules": loaded,
+        "budget_ms": BUDGETS_MS.get(module),
+        "within_budget": not loaded
+        and import_summary["median"] / 1e6 <= BUDGETS_MS.get(module, float("inf")),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time against budgets")
+    parser.add_argument("--module", nargs="+", default=list(BUDGETS_MS))
+    parser.add_argument("--repetitions", type=int, default=10)
+    parser.add_argument("--output", default="startup_results.json")
+    args = parser.parse_args()
+
+    results: list[dict[str, Any]] = []
+    for module in args.module:
+        result = run_module(module, args.repetitions)
+        budget = result["budget_ms"]
+        notes = [] if result["within_budget"] else ["OVER BUDGET"]
+        if result["heavy_modules"]:
+            notes.append(f"loads {', '.join(result['heavy_modules'])}")
+        print(
+            f"{module:>18} import median "
+            f"{result['import_summary_ns']['median'] / 1e6:>7.1f} ms "
+            f"budget {budget if budget is not None else '-':>5} ms, process median "
+            f"{result['process_summary_ns']['median'] / 1e6:>7.1f} ms"
+            + "".join(f", {note}" for note in notes)
+        )
+        results.append(result)
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {"environment": environment(), "config": vars(args), "results": results},
+            f,
+        )
+    # Non-zero so CI can gate on the budget
+    if not all(result["within_budget"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import argparse
+import json
+import math
+import statistics
+import time
+from typing import Any
+
+from benchmark import Backend, environment, transitive_closure
+from compiler import Compiler
+from generators import GENERATORS
+from observers import CompilerObserver
+
+
+class SizeObserver(CompilerObserver):
+    # Samples the database size after every iteration to find its peak
+    def __init__(self, backend: Backend) -> None:
+        self.backend = backend
+        self.peak_bytes = backend.size()
+
+    def on_iteration_end(
+        self, iter: int, delta_sizes: dict[str, int], elapsed_ns: int
+    ):
+        self.peak_bytes = max(self.peak_bytes, self.backend.size())
+
+
+def fit_power_law(xs: list[float], ys: list[float]) -> tuple[float, float]:
+    # Least squares fit of y = a * x^b in log-log space, returns (a, b)
+    points = [(math.log(x), math.log(y)) for x, y in zip(xs, ys) if x > 0 and y > 0]
+    if len(points) < 2:
+        return math.nan, math.nan
+    mean_x = statistics.fmean(x for x, _ in points)
+    mean_y = statistics.fmean(y for _, y in points)
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return math.nan, math.nan
+    b = sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+    return math.exp(mean_y - b * mean_x), b
+
+
+def run_point(
+    backend: Backend,
+    graph: str,
+    nodes: int,
+    edges: int,
+    seed: int,
+    repetitions: int,
+) -> dict[str, Any]:
+    samples: list[int] = []
+    iterations = 0
+    derived = 0
+    peak_bytes = -1
+    input_facts = 0
+    for i in range(repetitions):
+        input_facts = backend.load_edges(GENERATORS[graph](nodes, edges, seed))
+        observer = SizeObserver(backend)
+        compiler = Compiler(
+            backend.db_type,
+            backend.db_data,
+            transitive_closure(),
+            i,
+            observers=[observer],
+        )
+        t1 = time.perf_counter_ns()
+        compiler.poll()
+        t2 = time.perf_counter_ns()
+        samples.append(t2 - t1)
+        # Iteration 0 is the nonrecursive stratum
+        iterations = compiler.conn.iter + 1
+        derived = sum(record[3] for record in compiler.dump_convergence())
+        compiler.close()
+        peak_bytes = max(peak_bytes, observer.peak_bytes)
+    return {
+        "graph": graph,
+        "nodes": nodes,
+        "input_facts": input_facts,
+        "derived_facts": derived,
+        "iterations": iterations,
+        "peak_bytes": peak_bytes,
+        "samples_ns": samples,
+        "median_ns": statistics.median(samples),
+    }
+
+
+def fits(points: list[dict[str, Any]]) -> dict[str, dict[str, float]]:
+    # Poll time against the input and against the output of the closure.
+    # An exponent above 1 against the output means the engine itself scales
+    # superlinearly, not just the amount of derived facts.
+    medians = [point["median_ns"] for point in points]
+    found: dict[str, dict[str, float]] = {}
+    for key in ["input_facts", "derived_facts"]:
+        a, b = fit_power_law([point[key] for point in points], medians)
+        found[key] = {"coefficient": a, "exponent": b}
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scaling sweep on generated graphs")
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "duckdb"])
+    parser.add_argument(
+        "--graph", nargs="+", default=["erdos_renyi"], choices=list(GENERATORS)
+    )
+    parser.add_argument("--nodes", nargs="+", type=int, default=[100, 200, 400, 800])
+    parser.add_argument(
+        "--edge-factor",
+        type=float,
+        default=1.5,
+        help="edges per node for the random graphs",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument(
+        "--superlinear",
+        type=float,
+        default=1.1,
+        help="exponent above which a fit is flagged",
+    )
+    parser.add_argument("--data-dir", default="test/data")
+    parser.add_argument("--output", default="sweep_results.json")
+    args = parser.parse_args()
+
+    backend = Backend(args.backend, args.data_dir, snapshots=False)
+    results: list[dict[str, Any]] = []
+    for graph in args.graph:
+        points: list[dict[str, Any]] = []
+        for nodes in args.nodes:
+            edges = round(nodes * args.edge_factor)
+            point = run_point(backend, graph, nodes, edges, args.seed, args.repetitions)
+            print(
+                f"{graph:>12} {nodes:>7} nodes {point['input_facts']:>8} in "
+                f"{point['derived_facts']:>10} out {point['iterations']:>5} iters "
+                f"{point['median_ns'] / 1e6:>10.1f} ms "
+                f"{point['peak_bytes'] / 2**20:>8.1f} MiB"
+            )
+            points.append(point)
+        graph_fits = fits(points)
+        for key, fit in graph_fits.items():
+            flag = " superlinear" if fit["exponent"] > args.superlinear else ""
+            print(f"{graph:>12} time ~ {key}^{fit['exponent']:.2f}{flag}")
+        results.append({"graph": graph, "points": points, "fits": graph_fits})
+    backend.reset(transitive_closure())
+
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "environment": environment(),
+                "config": vars(args),
+                "results": results,
+            },
+            f,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import math
+import os
+import tempfile
+import unittest
+
+import sqlalchemy
+from sqlalchemy import text
+
+from benchmark import Backend, distinct, percentile, read_lines, summarize
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def test_percentile(self):
+        samples = [5, 1, 4, 2, 3]
+        self.assertEqual(3, percentile(samples, 0.5))
+        self.assertEqual(4.8, percentile(samples, 0.95))
+        self.assertEqual(5, percentile(samples, 1))
+
+    def test_summarize(self):
+        summary = summarize([10, 12, 14])
+        self.assertEqual(3, summary["n"])
+        self.assertEqual(12, summary["median"])
+        self.assertEqual(2, summary["stddev"])
+        # t with 2 degrees of freedom is 4.303
+        self.assertAlmostEqual(12 - 4.303 * 2 / 3**0.5, summary["ci95_low"])
+        self.assertAlmostEqual(12 + 4.303 * 2 / 3**0.5, summary["ci95_high"])
+
+    def test_single_sample(self):
+        summary = summarize([7])
+        self.assertEqual(0, summary["stddev"])
+        self.assertEqual(7, summary["ci95_low"])
+
+    def test_read_lines_scale(self):
+        lines = list(read_lines("test/data/dense.txt", 1))
+        half = list(read_lines("test/data/dense.txt", 0.5))
+        self.assertEqual(lines[: len(half)], half)
+        self.assertEqual(math.ceil(len(lines) / 2), len(half))
+
+    def test_distinct(self):
+        rows = [(1, 2), (2, 3), (1, 2)]
+        self.assertEqual([(1, 2), (2, 3)], list(distinct(rows)))
+
+    def test_snapshot_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            backend = Backend("sqlite", tmp)
+            facts = backend.load("dense", 0.5)
+            engine = sqlalchemy.create_engine(f"sqlite:///{backend.db_data['db']}")
+            with engine.connect() as conn:
+                count = conn.execute(text("SELECT COUNT(*) FROM E")).scalar()
+                conn.execute(text("INSERT INTO T VALUES (0, 0)"))
+                conn.commit()
+            self.assertEqual(facts, count)
+            engine.dispose()
+            # The second load copies the template, undoing the insert into T
+            self.assertEqual(facts, backend.load("dense", 0.5))
+            with engine.connect() as conn:
+                count = conn.execute(text("SELECT COUNT(*) FROM T")).scalar()
+            self.assertEqual(0, count)
+            engine.dispose()
+            # A template without its database is rebuilt
+            template = os.path.join(tmp, "template_sqlite_dense_0.5.db")
+            os.remove(template)
+            self.assertEqual(facts, backend.load("dense", 0.5))
+            self.assertTrue(os.path.exists(template))
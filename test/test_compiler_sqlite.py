@@ -1,4 +1,5 @@
 import os
+import tempfile
 import time
 import unittest
 from typing import Final
@@ -6,13 +7,45 @@ from typing import Final
 import sqlalchemy
 from sqlalchemy import Connection, text
 
-from compiler import Compiler
+from compiler import Compiler, convergence_report
+from conn_profiler import CommitScope
 from datalog import Atom, Program, Rule, TermConstant, TermVariable
+from delta_program import DELTA_PREFIX
+from observers import CompilerObserver, PrometheusObserver
+from plan_cache import PlanCache
+from scratch import ScratchMode
+from sinks import JsonlSink
 from dotenv import load_dotenv
 
 load_dotenv()
 
 
+class RecordingObserver(CompilerObserver):
+    def __init__(self) -> None:
+        self.events: list[tuple] = []
+        self.statements = 0
+
+    def on_poll_start(self, test_run: int):
+        self.events.append(("poll_start", test_run))
+
+    def on_poll_end(self, test_run: int, elapsed_ns: int):
+        self.events.append(("poll_end", test_run))
+
+    def on_stratum_start(self, stratum: str, iter: int):
+        self.events.append(("stratum_start", stratum))
+
+    def on_stratum_end(self, stratum: str, iter: int, elapsed_ns: int):
+        self.events.append(("stratum_end", stratum))
+
+    def on_iteration_end(
+        self, iter: int, delta_sizes: dict[str, int], elapsed_ns: int
+    ):
+        self.events.append(("iteration_end", iter, delta_sizes["T"]))
+
+    def on_statement(self, record):
+        self.statements += 1
+
+
 def get_or_intern(mapping: dict[str, int], value: str):
     if value not in mapping:
         mapping[value] = len(mapping)
@@ -502,3 +535,500 @@ class TestCompiler(unittest.TestCase):
         output = list(r.first())[0]
         self.assertEqual(output, 262144)
         conn.close()
+
+    def test_truncate_scratch_tables(self):
+        program = Program(
+            [
+                Rule.create("T", ["?x", "?y"], [("E", ["?x", "?y"])]),
+                Rule.create(
+                    "T", ["?x", "?z"], [("T", ["?x", "?y"]), ("E", ["?y", "?z"])]
+                ),
+            ]
+        )
+        db_name = "test/data/test_truncate_scratch_tables.db"
+        conn = self.setup_connection(db_name)
+        init_queries = [
+            """CREATE TABLE E (
+                E_0 INTEGER,
+                E_1 INTEGER
+            )""",
+            """CREATE TABLE T (
+                T_0 INTEGER,
+                T_1 INTEGER
+            )""",
+            "INSERT INTO E (E_0, E_1) VALUES (1, 2)",
+            "INSERT INTO E (E_0, E_1) VALUES (2, 3)",
+            "INSERT INTO E (E_0, E_1) VALUES (3, 4)",
+        ]
+        for query in init_queries:
+            conn.execute(text(query))
+        conn.commit()
+
+        compiler = Compiler(
+            "sqlite", {"db": db_name}, program, 0, scratch_mode=ScratchMode.TRUNCATE
+        )
+        compiler.poll()
+        expected = {(1, 2), (2, 3), (3, 4), (1, 3), (2, 4), (1, 4)}
+        r = conn.execute(text("SELECT * FROM T"))
+        self.assertEqual(expected, set(r.fetchall()))
+        # Scratch tables are temporary and never reach the database file
+        r = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'table'"))
+        self.assertEqual({"E", "T", "dE", "dT"}, {row[0] for row in r.fetchall()})
+        conn.close()
+
+    def test_commit_per_poll(self):
+        program = Program(
+            [
+                Rule.create("T", ["?x", "?y"], [("E", ["?x", "?y"])]),
+                Rule.create(
+                    "T", ["?x", "?z"], [("T", ["?x", "?y"]), ("E", ["?y", "?z"])]
+                ),
+            ]
+        )
+        db_name = "test/data/test_commit_per_poll.db"
+        conn = self.setup_connection(db_name)
+        init_queries = [
+            """CREATE TABLE E (
+                E_0 INTEGER,
+                E_1 INTEGER
+            )""",
+            """CREATE TABLE T (
+                T_0 INTEGER,
+                T_1 INTEGER
+            )""",
+            "INSERT INTO E (E_0, E_1) VALUES (1, 2)",
+            "INSERT INTO E (E_0, E_1) VALUES (2, 3)",
+            "INSERT INTO E (E_0, E_1) VALUES (3, 4)",
+        ]
+        for query in init_queries:
+            conn.execute(text(query))
+        conn.commit()
+
+        compiler = Compiler(
+            "sqlite", {"db": db_name}, program, 0, commit_scope=CommitScope.POLL
+        )
+        compiler.poll()
+        expected = {(1, 2), (2, 3), (3, 4), (1, 3), (2, 4), (1, 4)}
+        r = conn.execute(text("SELECT * FROM T"))
+        self.assertEqual(expected, set(r.fetchall()))
+        commits = [stmt for stmt in compiler.dump_benchmark() if stmt[2] == "COMMIT"]
+        self.assertEqual(1, len(commits))
+        conn.close()
+
+    def test_convergence_telemetry(self):
+        program = Program(
+            [
+                Rule.create("T", ["?x", "?y"], [("E", ["?x", "?y"])]),
+                Rule.create(
+                    "T", ["?x", "?z"], [("T", ["?x", "?y"]), ("E", ["?y", "?z"])]
+                ),
+            ]
+        )
+        db_name = "test/data/test_convergence_telemetry.db"
+        conn = self.setup_connection(db_name)
+        init_queries = [
+            """CREATE TABLE E (
+                E_0 INTEGER,
+                E_1 INTEGER
+            )""",
+            """CREATE TABLE T (
+                T_0 INTEGER,
+                T_1 INTEGER
+            )""",
+            "INSERT INTO E (E_0, E_1) VALUES (1, 2)",
+            "INSERT INTO E (E_0, E_1) VALUES (2, 3)",
+            "INSERT INTO E (E_0, E_1) VALUES (3, 4)",
+            "INSERT INTO E (E_0, E_1) VALUES (4, 5)",
+        ]
+        for query in init_queries:
+            conn.execute(text(query))
+        conn.commit()
+
+        compiler = Compiler(
+            "sqlite", {"db": db_name}, program, 0, convergence_telemetry=True
+        )
+        compiler.poll()
+        records = compiler.dump_convergence()
+        self.assertEqual({"T"}, {relation for _, _, relation, _, _ in records})
+        # The fixpoint ends with an iteration that derives nothing new
+        self.assertEqual(0, records[-1][3])
+        report = convergence_report(records)["T"]
+        self.assertEqual(10, report["new_facts"])
+        for iteration in report["iterations"]:
+            self.assertGreaterEqual(iteration["eval_facts"], iteration["new_facts"])
+        conn.close()
+
+    def test_observers(self):
+        program = Program(
+            [
+                Rule.create("T", ["?x", "?y"], [("E", ["?x", "?y"])]),
+                Rule.create(
+                    "T", ["?x", "?z"], [("T", ["?x", "?y"]), ("E", ["?y", "?z"])]
+                ),
+            ]
+        )
+        db_name = "test/data/test_observers.db"
+        metrics_path = "test/data/test_observers.prom"
+        conn = self.setup_connection(db_name)
+        init_queries = [
+            """CREATE TABLE E (
+                E_0 INTEGER,
+                E_1 INTEGER
+            )""",
+            """CREATE TABLE T (
+                T_0 INTEGER,
+                T_1 INTEGER
+            )""",
+            "INSERT INTO E (E_0, E_1) VALUES (1, 2)",
+            "INSERT INTO E (E_0, E_1) VALUES (2, 3)",
+            "INSERT INTO E (E_0, E_1) VALUES (3, 4)",
+        ]
+        for query in init_queries:
+            conn.execute(text(query))
+        conn.commit()
+
+        observer = RecordingObserver()
+        prometheus = PrometheusObserver(metrics_path)
+        compiler = Compiler(
+            "sqlite", {"db": db_name}, program, 0, observers=[observer, prometheus]
+        )
+        compiler.poll()
+        self.assertEqual(
+            [
+                ("poll_start", 0),
+                ("stratum_start", "nonrecursive"),
+                ("iteration_end", 0, 5),
+                ("stratum_end", "nonrecursive"),
+                ("stratum_start", "recursive"),
+                ("iteration_end", 1, 1),
+                ("iteration_end", 2, 0),
+                ("stratum_end", "recursive"),
+                ("poll_end", 0),
+            ],
+            observer.events,
+        )
+        self.assertEqual(len(compiler.dump_benchmark()), observer.statements)
+        with open(metrics_path) as f:
+            metrics = f.read().splitlines()
+        self.assertIn("pyterry_poll_running 0", metrics)
+        self.assertIn("pyterry_facts_derived_total 6", metrics)
+        self.assertIn('pyterry_relation_facts_derived_total{relation="T"} 6', metrics)
+        os.remove(metrics_path)
+        conn.close()
+
+    def test_poll_after_insert(self):
+        # A second poll absorbs new facts without duplicating old ones
+        program = Program(
+            [
+                Rule.create("T", ["?x", "?y"], [("E", ["?x", "?y"])]),
+                Rule.create(
+                    "T", ["?x", "?z"], [("T", ["?x", "?y"]), ("E", ["?y", "?z"])]
+                ),
+            ]
+        )
+        db_name = "test/data/test_poll_after_insert.db"
+        conn = self.setup_connection(db_name)
+        init_queries = [
+            """CREATE TABLE E (
+                E_0 INTEGER,
+                E_1 INTEGER
+            )""",
+            """CREATE TABLE T (
+                T_0 INTEGER,
+                T_1 INTEGER
+            )""",
+            "INSERT INTO E (E_0, E_1) VALUES (1, 2)",
+            "INSERT INTO E (E_0, E_1) VALUES (2, 3)",
+        ]
+        for query in init_queries:
+            conn.execute(text(query))
+        conn.commit()
+
+        Compiler("sqlite", {"db": db_name}, program, 0).poll()
+        conn.execute(text("INSERT INTO E (E_0, E_1) VALUES (3, 4)"))
+        conn.commit()
+        Compiler("sqlite", {"db": db_name}, program, 1).poll()
+        result = conn.execute(text("SELECT * FROM T")).fetchall()
+        self.assertEqual(
+            [(1, 2), (1, 3), (1, 4), (2, 3), (2, 4), (3, 4)], sorted(result)
+        )
+        conn.close()
+
+    def test_plan_cache(self):
+        # The second compiler loads its plans instead of compiling the program
+        program = Program(
+            [
+                Rule.create("T", ["?x", "?y"], [("E", ["?x", "?y"])]),
+                Rule.create(
+                    "T", ["?x", "?z"], [("T", ["?x", "?y"]), ("E", ["?y", "?z"])]
+                ),
+            ]
+        )
+        db_name = "test/data/test_plan_cache.db"
+        conn = self.setup_connection(db_name)
+        init_queries = [
+            """CREATE TABLE E (
+                E_0 INTEGER,
+                E_1 INTEGER
+            )""",
+            """CREATE TABLE T (
+                T_0 INTEGER,
+                T_1 INTEGER
+            )""",
+            "INSERT INTO E (E_0, E_1) VALUES (1, 2)",
+            "INSERT INTO E (E_0, E_1) VALUES (2, 3)",
+        ]
+        for query in init_queries:
+            conn.execute(text(query))
+        conn.commit()
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PlanCache(directory)
+            compilers: list[Compiler] = []
+            for test_run in range(2):
+                compiler = Compiler(
+                    "sqlite",
+                    {"db": db_name},
+                    program,
+                    test_run,
+                    profile=True,
+                    plan_cache=cache,
+                )
+                compiler.poll()
+                compilers.append(compiler)
+                conn.execute(text("INSERT INTO E (E_0, E_1) VALUES (3, 4)"))
+                conn.commit()
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+        # Only the compiler that planned the rules records planning per rule
+        for compiler, planned in zip(compilers, [True, False]):
+            records = compiler.dump_benchmark()
+            for tag in ["PY_STACK", "PY_RENDER"]:
+                rules = {record[4] for record in records if record[2] == tag}
+                self.assertEqual(
+                    {rule.serialize() for rule in compiler.rule_plans}
+                    if planned
+                    else set(),
+                    rules,
+                )
+            self.assertIn("PY_FRONTEND", {record[2] for record in records})
+        result = conn.execute(text("SELECT * FROM T")).fetchall()
+        self.assertEqual(
+            [(1, 2), (1, 3), (1, 4), (2, 3), (2, 4), (3, 4)], sorted(result)
+        )
+        conn.close()
+
+    def test_failed_poll_with_cprofile(self):
+        # A failed poll releases the profiler, so the next poll can profile
+        program = Program([Rule.create("T", ["?x", "?y"], [("E", ["?x", "?y"])])])
+        db_name = "test/data/test_failed_poll.db"
+        conn = self.setup_connection(db_name)
+        conn.execute(text("CREATE TABLE E (E_0 INTEGER, E_1 INTEGER)"))
+        conn.execute(text("CREATE TABLE T (T_0 INTEGER, T_1 INTEGER)"))
+        conn.execute(text("INSERT INTO E (E_0, E_1) VALUES (1, 2)"))
+        conn.commit()
+        with tempfile.TemporaryDirectory() as directory:
+            observer = RecordingObserver()
+            compiler = Compiler(
+                "sqlite",
+                {"db": db_name},
+                program,
+                0,
+                cprofile_dir=directory,
+                observers=[observer],
+            )
+            conn.execute(text(f"DROP TABLE {DELTA_PREFIX}E"))
+            conn.commit()
+            with self.assertRaises(sqlalchemy.exc.OperationalError):
+                compiler.poll()
+            self.assertEqual([("poll_start", 0)], observer.events[:1])
+            self.assertNotIn("poll_end", [event[0] for event in observer.events])
+            self.assertEqual(["poll_0.prof"], os.listdir(directory))
+
+            conn.execute(
+                text(f"CREATE TABLE {DELTA_PREFIX}E (E_0 INTEGER, E_1 INTEGER)")
+            )
+            conn.commit()
+            compiler = Compiler(
+                "sqlite", {"db": db_name}, program, 1, cprofile_dir=directory
+            )
+            compiler.poll()
+            self.assertEqual(
+                ["poll_0.prof", "poll_1.prof"], sorted(os.listdir(directory))
+            )
+        result = conn.execute(text("SELECT * FROM T")).fetchall()
+        self.assertEqual([(1, 2)], result)
+        conn.close()
+
+    def test_close_sink(self):
+        # The poll flushes the sink and closing the compiler closes its file
+        program = Program([Rule.create("T", ["?x", "?y"], [("E", ["?x", "?y"])])])
+        db_name = "test/data/test_close_sink.db"
+        conn = self.setup_connection(db_name)
+        conn.execute(text("CREATE TABLE E (E_0 INTEGER, E_1 INTEGER)"))
+        conn.execute(text("CREATE TABLE T (T_0 INTEGER, T_1 INTEGER)"))
+        conn.execute(text("INSERT INTO E (E_0, E_1) VALUES (1, 2)"))
+        conn.commit()
+        with tempfile.TemporaryDirectory() as directory:
+            sink = JsonlSink(os.path.join(directory, "statements.jsonl"))
+            compiler = Compiler(
+                "sqlite", {"db": db_name}, program, 0, profile=True, sink=sink
+            )
+            compiler.poll()
+            self.assertFalse(sink.file.closed)
+            records = compiler.dump_benchmark()
+            compiler.close()
+            self.assertTrue(sink.file.closed)
+            self.assertEqual(records, compiler.dump_benchmark())
+            compiler.close()
+
+            # Closing a compiler that never polled releases its connection
+            compiler = Compiler("sqlite", {"db": db_name}, program, 1)
+            self.assertFalse(compiler.conn.conn.closed)
+            compiler.close()
+            self.assertTrue(compiler.conn.conn.closed)
+        conn.close()
+
+    def test_mutual_recursion(self):
+        # A and B derive each other and S reads A, all of them keep changing
+        # until the fixpoint. F reads the empty G, its rule is skipped.
+        program = Program(
+            [
+                Rule.create("A", ["?x", "?y"], [("E", ["?x", "?y"])]),
+                Rule.create(
+                    "B", ["?x", "?z"], [("A", ["?x", "?y"]), ("E", ["?y", "?z"])]
+                ),
+                Rule.create(
+                    "A", ["?x", "?z"], [("B", ["?x", "?y"]), ("E", ["?y", "?z"])]
+                ),
+                Rule.create("S", ["?x", "?y"], [("A", ["?x", "?y"])]),
+                Rule.create("F", ["?x", "?y"], [("G", ["?x", "?y"])]),
+            ]
+        )
+        db_name = "test/data/test_mutual_recursion.db"
+        conn = self.setup_connection(db_name)
+        for relation in ["E", "A", "B", "S", "F", "G"]:
+            columns = f"{relation}_0 INTEGER, {relation}_1 INTEGER"
+            conn.execute(text(f"CREATE TABLE {relation} ({columns})"))
+        for x in range(1, 5):
+            conn.execute(text(f"INSERT INTO E (E_0, E_1) VALUES ({x}, {x + 1})"))
+        conn.commit()
+
+        compiler = Compiler("sqlite", {"db": db_name}, program, 0)
+        compiler.poll()
+        odd = [(1, 2), (1, 4), (2, 3), (2, 5), (3, 4), (4, 5)]
+        even = [(1, 3), (1, 5), (2, 4), (3, 5)]
+        for relation, expected in [("A", odd), ("B", even), ("S", odd), ("F", [])]:
+            result = conn.execute(text(f"SELECT * FROM {relation}")).fetchall()
+            self.assertEqual(expected, sorted(result))
+        skipped = compiler.dump_skipped_rules()
+        self.assertEqual(
+            1, skipped[f"{DELTA_PREFIX}F(?x, ?y) :- {DELTA_PREFIX}G(?x, ?y)"]
+        )
+        conn.close()
+
+    def test_nonlinear_tc(self):
+        # Paths from two new halves are derived by one variant only, the
+        # other reads the facts from before the iteration
+        program = Program(
+            [
+                Rule.create("T", ["?x", "?y"], [("E", ["?x", "?y"])]),
+                Rule.create(
+                    "T", ["?x", "?z"], [("T", ["?x", "?y"]), ("T", ["?y", "?z"])]
+                ),
+            ]
+        )
+        db_name = "test/data/test_nonlinear_tc.db"
+        conn = self.setup_connection(db_name)
+        conn.execute(text("CREATE TABLE E (E_0 INTEGER, E_1 INTEGER)"))
+        conn.execute(text("CREATE TABLE T (T_0 INTEGER, T_1 INTEGER)"))
+        for x in range(1, 10):
+            conn.execute(text(f"INSERT INTO E (E_0, E_1) VALUES ({x}, {x + 1})"))
+        conn.commit()
+
+        compiler = Compiler("sqlite", {"db": db_name}, program, 0)
+        self.assertEqual({"T": "OLD_T"}, compiler.old_relations)
+        compiler.poll()
+        result = conn.execute(text("SELECT * FROM T")).fetchall()
+        expected = [(x, y) for x in range(1, 11) for y in range(x + 1, 11)]
+        self.assertEqual(expected, sorted(result))
+        # Only kept up to date during the recursive iterations
+        self.assertEqual(0, conn.execute(text("SELECT COUNT(*) FROM OLD_T")).scalar())
+        conn.close()
+
+    def test_hoisted_selection(self):
+        # The selection on E is filled once for all recursive iterations
+        program = Program(
+            [
+                Rule.create("R", ["?x", "?y"], [("S", ["?x", "?y"])]),
+                Rule.create(
+                    "R", ["?x", "?z"], [("R", ["?x", "?y"]), ("E", ["?y", 1, "?z"])]
+                ),
+            ]
+        )
+        db_name = "test/data/test_hoisted_selection.db"
+        conn = self.setup_connection(db_name)
+        init_queries = [
+            "CREATE TABLE E (E_0 INTEGER, E_1 INTEGER, E_2 INTEGER)",
+            "CREATE TABLE S (S_0 INTEGER, S_1 INTEGER)",
+            "CREATE TABLE R (R_0 INTEGER, R_1 INTEGER)",
+            "INSERT INTO E VALUES (2, 1, 3), (3, 1, 4), (4, 1, 5), (5, 1, 6)",
+            "INSERT INTO E VALUES (6, 2, 7), (7, 1, 8)",
+            "INSERT INTO S VALUES (1, 2)",
+        ]
+        for query in init_queries:
+            conn.execute(text(query))
+        conn.commit()
+
+        compiler = Compiler("sqlite", {"db": db_name}, program, 0, profile=True)
+        compiler.poll()
+        result = conn.execute(text("SELECT * FROM R")).fetchall()
+        self.assertEqual([(1, y) for y in range(2, 7)], sorted(result))
+        rule = f"{DELTA_PREFIX}R(?x, ?z) :- {DELTA_PREFIX}R(?x, ?y), E(?y, 1, ?z)"
+        iterations: dict[str, set[int]] = {"SPJ_SELECT": set(), "SPJ_JOIN": set()}
+        for _, iter, tag, _, record_rule, _, _ in compiler.dump_benchmark():
+            if record_rule == rule and tag in iterations:
+                iterations[tag].add(iter)
+        self.assertEqual(1, len(iterations["SPJ_SELECT"]))
+        self.assertLess(1, len(iterations["SPJ_JOIN"]))
+        self.assertEqual(set(), compiler.kept_tables)
+        conn.close()
+
+    def test_selection_partitions(self):
+        # T_1eq2 and OLD_T_1eq2 are filled once and appended every iteration
+        program = Program(
+            [
+                Rule.create("T", ["?x", "?k", "?y"], [("E", ["?x", "?k", "?y"])]),
+                Rule.create(
+                    "T",
+                    ["?x", 2, "?z"],
+                    [("T", ["?x", 2, "?y"]), ("T", ["?y", 2, "?z"])],
+                ),
+            ]
+        )
+        db_name = "test/data/test_selection_partitions.db"
+        conn = self.setup_connection(db_name)
+        conn.execute(text("CREATE TABLE E (E_0 INTEGER, E_1 INTEGER, E_2 INTEGER)"))
+        conn.execute(text("CREATE TABLE T (T_0 INTEGER, T_1 INTEGER, T_2 INTEGER)"))
+        for x in range(1, 12):
+            label = 1 if x % 5 == 4 else 2
+            conn.execute(text(f"INSERT INTO E VALUES ({x}, {label}, {x + 1})"))
+        conn.commit()
+
+        compiler = Compiler("sqlite", {"db": db_name}, program, 0)
+        self.assertEqual(
+            {"T": {"T_1eq2": "T_1 = 2"}, "OLD_T": {"OLD_T_1eq2": "T_1 = 2"}},
+            compiler.partitions,
+        )
+        compiler.poll()
+        result = conn.execute(text("SELECT * FROM T WHERE T_1 = 2")).fetchall()
+        # Edges out of 4 and 9 have label 1 and split the chain
+        expected = [
+            (x, 2, y)
+            for chain in [range(1, 5), range(5, 10), range(10, 13)]
+            for x in chain
+            for y in chain
+            if x < y
+        ]
+        self.assertEqual(expected, sorted(result))
+        self.assertEqual(set(), compiler.kept_tables)
+        conn.close()
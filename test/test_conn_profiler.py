@@ -0,0 +1,72 @@
+import unittest
+
+import sqlalchemy
+
+from conn_profiler import ConnectionProfiler, Tag, changed_plans, time_by_side
+from sinks import MemorySink
+
+
+class TestConnectionProfiler(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.engine = sqlalchemy.create_engine("sqlite://")
+        self.conn = ConnectionProfiler(self.engine.connect(), 0)
+        self.conn.execute(Tag.COMPILER_INIT, "CREATE TABLE E (E_0 INTEGER)")
+
+    def tearDown(self) -> None:
+        self.conn.close()
+        self.engine.dispose()
+
+    def test_rows_affected(self):
+        self.conn.execute(Tag.MAT_REC, "INSERT INTO E (E_0) VALUES (1), (2), (3)")
+        self.conn.execute(Tag.MAT_REC, "DELETE FROM E WHERE E_0 > 1")
+        _, _, _, _, _, inserted, _ = self.conn.statements[1]
+        _, _, _, _, _, deleted, _ = self.conn.statements[2]
+        self.assertEqual(3, inserted)
+        self.assertEqual(2, deleted)
+
+    def test_rows_returned(self):
+        self.conn.execute(Tag.MAT_REC, "INSERT INTO E (E_0) VALUES (1), (2)")
+        r = self.conn.execute(Tag.FACT_COUNT, "SELECT * FROM E")
+        # The profiler counts the rows but they can still be fetched
+        self.assertEqual([(1,), (2,)], r.fetchall())
+        test_run, iter, tag, elapsed_ns, rule, _, returned = self.conn.statements[2]
+        self.assertEqual((0, -1, "FACT_COUNT", ""), (test_run, iter, tag, rule))
+        self.assertGreater(elapsed_ns, 0)
+        self.assertEqual(2, returned)
+
+    def test_explain_slow_statements(self):
+        self.conn.slow_statement_ns = 0
+        # Plans still find their statement after older records were dropped
+        self.conn.sink = MemorySink(max_records=2)
+        self.conn.execute(Tag.SPJ_SELECT, "SELECT 1")
+        self.conn.execute(Tag.SPJ_SELECT, "CREATE TABLE T (T_0 INTEGER)")
+        stmt = "INSERT INTO T SELECT * FROM E WHERE E_0 = 1"
+        self.conn.execute(Tag.SPJ_SELECT, stmt, "T(?x) :- E(?x)")
+        # DDL has no plan, so only the insert is explained
+        [(test_run, iter, tag, elapsed_ns, plan_stmt, plan)] = self.conn.plans[
+            "T(?x) :- E(?x)"
+        ]
+        self.assertIn(
+            (test_run, iter, tag, elapsed_ns, "T(?x) :- E(?x)"),
+            [record[:5] for record in self.conn.statements],
+        )
+        self.assertEqual(stmt, plan_stmt)
+        self.assertIn("SCAN E", plan)
+
+    def test_changed_plans(self):
+        old = {"T(?x) :- E(?x)": [(0, 0, "SPJ_SELECT", 10, "SELECT 1", "SCAN E")]}
+        new = {"T(?x) :- E(?x)": [(0, 0, "SPJ_SELECT", 10, "SELECT 1", "SEARCH E")]}
+        self.assertEqual([], changed_plans(old, old))
+        self.assertEqual(
+            [("T(?x) :- E(?x)", "SELECT 1", "SCAN E", "SEARCH E")],
+            changed_plans(old, new),
+        )
+
+    def test_time_by_side(self):
+        records = [
+            (0, -1, "PY_FRONTEND", 5, "", -1, 0),
+            (0, 0, "SPJ_SELECT", 10, "T(?x) :- E(?x)", 1, 0),
+            (0, 0, "PY_RENDER", 3, "T(?x) :- E(?x)", -1, 0),
+        ]
+        self.assertEqual({"python_ns": 8, "database_ns": 10}, time_by_side(records))
@@ -0,0 +1,30 @@
+import pickle
+import unittest
+from copy import deepcopy
+
+from datalog import Rule, TermConstant, TermVariable
+
+
+class TestDatalog(unittest.TestCase):
+    def test_terms_are_interned(self):
+        self.assertIs(TermVariable("x"), TermVariable("x"))
+        self.assertIs(TermConstant(2), TermConstant(2))
+        self.assertIsNot(TermConstant(1), TermConstant(True))
+        self.assertIsNot(TermConstant(1), TermConstant("1"))
+        self.assertNotEqual(TermVariable("x"), TermConstant("x"))
+
+        term = TermVariable("x")
+        self.assertIs(deepcopy(term), term)
+        self.assertIs(pickle.loads(pickle.dumps(term)), term)
+        with self.assertRaises(AttributeError):
+            term.name = "y"
+
+    def test_rules_compare_by_value(self):
+        rule = Rule.create("T", ["?x", 1], [("E", ["?x", 1])])
+        same = Rule.create("T", ["?x", 1], [("E", ["?x", 1])])
+        self.assertIsNot(rule, same)
+        self.assertEqual(rule, same)
+        self.assertEqual(len({rule, same}), 1)
+        self.assertIs(rule.head.symbol, same.head.symbol)
+        self.assertIs(rule.head.terms[0], rule.body[0].terms[0])
+        self.assertEqual(pickle.loads(pickle.dumps(rule)), rule)
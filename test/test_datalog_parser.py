@@ -0,0 +1,90 @@
+import unittest
+
+from datalog import Program, Rule
+from datalog_parser import ParseError, parse_facts, parse_program
+
+
+class TestDatalogParser(unittest.TestCase):
+    def test_round_trip(self):
+        program = Program(
+            [
+                Rule.create("T", ["?x", "?y"], [("E", ["?x", "?y"])]),
+                Rule.create(
+                    "T", ["?x", "?z"], [("T", ["?x", "?y"]), ("E", ["?y", "?z"])]
+                ),
+                Rule.create(
+                    "ΔT", ["?x", 3, "name"], [("RDF", ["?x", -1, 2.5, True])]
+                ),
+            ]
+        )
+        text = "\n".join(rule.serialize() for rule in program)
+        self.assertEqual(parse_program(text), program)
+
+    def test_round_trip_constants(self):
+        # Strings that look like other constants or syntax stay strings
+        constants = [
+            "a b",
+            "a, b",
+            "E(1)",
+            "12",
+            "2.5",
+            "True",
+            "inf",
+            "",
+            'say "hi" \\',
+            "line\nbreak\u2028",
+            1e20,
+            1.5e-07,
+            float("inf"),
+            -float("inf"),
+            0,
+            False,
+        ]
+        program = Program([Rule.create("T", constants, [("E", constants)])])
+        text = "\n".join(rule.serialize() for rule in program)
+        self.assertEqual(len(text.splitlines()), 1)
+        self.assertEqual(parse_program(text), program)
+        self.assertEqual(
+            [term.value for term in parse_program(text)[0].head.terms],
+            constants,
+        )
+
+    def test_multi_line_rules_and_comments(self):
+        program = parse_program(
+            """
+            % transitive closure
+            T(?x, ?y) :- E(?x, ?y).
+            T(?x, ?z) :-
+                T(?x, ?y),
+                E(?y,
+                  ?z)  # continues inside parentheses
+            """
+        )
+        expected = Program(
+            [
+                Rule.create("T", ["?x", "?y"], [("E", ["?x", "?y"])]),
+                Rule.create(
+                    "T", ["?x", "?z"], [("T", ["?x", "?y"]), ("E", ["?y", "?z"])]
+                ),
+            ]
+        )
+        self.assertEqual(program, expected)
+
+    def test_facts(self):
+        facts = list(parse_facts(['E(1, 2).\n', 'E(2, "a b").  E(3, x)\n', "\n"]))
+        self.assertEqual(facts, [("E", (1, 2)), ("E", (2, "a b")), ("E", (3, "x"))])
+
+    def test_errors_report_lines(self):
+        with self.assertRaises(ParseError) as context:
+            parse_program("T(?x) :- E(?x)\nT(?x) :- E(?x\nT(?x) :- E(?x)")
+        self.assertEqual(context.exception.line, 3)
+        self.assertIn("<string>:3:1", str(context.exception))
+
+        with self.assertRaises(ParseError) as context:
+            list(parse_facts(["E(1, 2)\n", "E(1, ?y)\n"], "facts.dl"))
+        self.assertEqual(context.exception.line, 2)
+        self.assertIn("not ground", str(context.exception))
+
+        with self.assertRaises(ParseError) as context:
+            parse_program("T(?x) :- E(?x) $")
+        self.assertEqual((context.exception.line, context.exception.column), (1, 16))
@@ -1,7 +1,12 @@
 import unittest
 
 from datalog import Program, Rule
-from delta_program import make_delta_program
+from delta_program import (
+    DELTA_PREFIX,
+    OLD_PREFIX,
+    make_delta_program,
+    make_old_new_program,
+)
 
 
 class TestDeltaProgram(unittest.TestCase):
@@ -99,3 +104,74 @@ class TestDeltaProgram(unittest.TestCase):
         )
 
         self.assertEqual(str(actual_program), str(expected_program))
+
+    def test_delta_rules_share_atoms(self):
+        program = Program(
+            [
+                Rule.create(
+                    "tc", ["?x", "?z"], [("tc", ["?x", "?y"]), ("e", ["?y", "?z"])]
+                ),
+            ]
+        )
+        rule = program[0]
+        delta_program = make_delta_program(program, True)
+
+        # The original rule is untouched and unchanged atoms are shared
+        self.assertEqual(str(rule.head.symbol), "tc")
+        for delta_rule in delta_program:
+            self.assertIs(delta_rule.head.terms, rule.head.terms)
+            shared = [atom for atom in delta_rule.body if atom in rule.body]
+            self.assertEqual(len(shared), 1)
+            self.assertIs(shared[0], rule.body[rule.body.index(shared[0])])
+        with self.assertRaises(AttributeError):
+            rule.head.symbol = "e"
+
+    def test_make_old_new_program(self):
+        # Only the changing relation left of the delta atom is read as old
+        d, old = DELTA_PREFIX, OLD_PREFIX
+        program = Program(
+            [
+                Rule.create(
+                    f"{d}tc",
+                    ["?x", "?w"],
+                    [
+                        ("tc", ["?x", "?y"]),
+                        ("e", ["?y", "?z"]),
+                        (f"{d}tc", ["?z", "?w"]),
+                    ],
+                ),
+                Rule.create(
+                    f"{d}tc",
+                    ["?x", "?w"],
+                    [
+                        (f"{d}tc", ["?x", "?y"]),
+                        ("e", ["?y", "?z"]),
+                        ("tc", ["?z", "?w"]),
+                    ],
+                ),
+            ]
+        )
+        actual_program = make_old_new_program(program, {"tc"})
+        expected_program = Program(
+            [
+                Rule.create(
+                    f"{d}tc",
+                    ["?x", "?w"],
+                    [
+                        (f"{old}tc", ["?x", "?y"]),
+                        ("e", ["?y", "?z"]),
+                        (f"{d}tc", ["?z", "?w"]),
+                    ],
+                ),
+                Rule.create(
+                    f"{d}tc",
+                    ["?x", "?w"],
+                    [
+                        (f"{d}tc", ["?x", "?y"]),
+                        ("e", ["?y", "?z"]),
+                        ("tc", ["?z", "?w"]),
+                    ],
+                ),
+            ]
+        )
+        self.assertEqual(str(actual_program), str(expected_program))
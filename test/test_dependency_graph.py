@@ -2,7 +2,12 @@ import unittest
 from copy import deepcopy
 
 from datalog import Atom, Program, Rule, TermVariable
-from dependency_graph import sort_program
+from dependency_graph import (
+    changing_relations,
+    generate_rule_dependency_graph,
+    sort_program,
+    stratify,
+)
 
 
 class TestDependencyGraph(unittest.TestCase):
@@ -127,3 +132,42 @@ class TestDependencyGraph(unittest.TestCase):
             expected_program.append(rule)
         # print(f"sorted_program = {sorted_program}")
         self.assertEqual(str(expected_program), str(sorted_program))
+
+    def test_sccs_in_dependency_order(self):
+        # A and B read each other, C reads B and D is unrelated
+        program = Program(
+            [
+                Rule.create("C", ["?x"], [("B", ["?x"])]),
+                Rule.create("A", ["?x"], [("B", ["?x"]), ("E", ["?x"])]),
+                Rule.create("B", ["?x"], [("A", ["?x"])]),
+                Rule.create("D", ["?x"], [("E", ["?x"])]),
+            ]
+        )
+        graph = generate_rule_dependency_graph(program)
+        strata = [[str(rule.head.symbol) for rule in s] for s in stratify(graph)]
+        self.assertEqual([["A", "B"], ["C"], ["D"]], strata)
+
+    def test_changing_relations(self):
+        # A and B are on a cycle, C is derived from B, D only from base facts
+        program = Program(
+            [
+                Rule.create("C", ["?x"], [("B", ["?x"])]),
+                Rule.create("A", ["?x"], [("B", ["?x"]), ("E", ["?x"])]),
+                Rule.create("B", ["?x"], [("A", ["?x"])]),
+                Rule.create("D", ["?x"], [("E", ["?x"])]),
+                Rule.create("T", ["?x"], [("T", ["?x"]), ("D", ["?x"])]),
+            ]
+        )
+        self.assertEqual({"A", "B", "C", "T"}, changing_relations(program))
+
+    def test_deep_chain(self):
+        # Deeper than the recursion limit
+        length = 5000
+        rules = [Rule.create("R0", ["?x"], [("E", ["?x"])])]
+        for i in range(1, length):
+            rules.append(Rule.create(f"R{i}", ["?x"], [(f"R{i - 1}", ["?x"])]))
+        sorted_program = sort_program(Program(rules))
+        self.assertEqual(
+            [f"R{i}" for i in range(length)],
+            [rule.head.symbol for rule in sorted_program],
+        )
@@ -0,0 +1,32 @@
+import unittest
+
+from datalog import TermVariable
+from frontend_bench import measure, random_program, stages
+
+
+class TestFrontendBench(unittest.TestCase):
+
+    def test_random_program(self):
+        program = random_program(10, 50, 4, seed=3)
+        self.assertEqual(50, len(program))
+        self.assertEqual(
+            [rule.serialize() for rule in program],
+            [rule.serialize() for rule in random_program(10, 50, 4, seed=3)],
+        )
+        for rule in program:
+            self.assertLessEqual(len(rule.body), 4)
+            body_variables = {
+                term.name
+                for atom in rule.body
+                for term in atom.terms
+                if isinstance(term, TermVariable)
+            }
+            for term in rule.head.terms:
+                self.assertIn(term.name, body_variables)
+
+    def test_stages(self):
+        program = random_program(6, 20, 3, seed=1)
+        for name, stage in stages(program).items():
+            result = measure(stage, 2)
+            self.assertEqual(2, len(result["samples_ns"]), name)
+            self.assertGreater(result["peak_bytes"], 0, name)
@@ -0,0 +1,37 @@
+import unittest
+
+from generators import GENERATORS, chain, cycle, erdos_renyi, grid, power_law, tree
+from sweep import fit_power_law
+
+
+class TestGenerators(unittest.TestCase):
+
+    def test_shapes(self):
+        self.assertEqual([(0, 1), (1, 2), (2, 3)], chain(4))
+        self.assertEqual([(0, 1), (1, 2), (2, 0)], cycle(3))
+        self.assertEqual([(0, 1), (0, 2), (1, 3), (1, 4)], tree(5))
+        self.assertEqual([(0, 1), (0, 2), (1, 3), (2, 3)], grid(4))
+
+    def test_random_graphs(self):
+        for generate in [erdos_renyi, power_law]:
+            edges = generate(50, 120, 7)
+            self.assertEqual(120, len(edges))
+            self.assertEqual(len(edges), len(set(edges)))
+            self.assertTrue(all(src != dst for src, dst in edges))
+            self.assertTrue(all(0 <= node < 50 for edge in edges for node in edge))
+            # The same seed gives the same graph
+            self.assertEqual(edges, generate(50, 120, 7))
+            self.assertNotEqual(edges, generate(50, 120, 8))
+
+    def test_edges_are_capped(self):
+        self.assertEqual(6, len(erdos_renyi(3, 100, 0)))
+
+    def test_registry(self):
+        for generate in GENERATORS.values():
+            self.assertTrue(generate(10, 15, 0))
+
+    def test_fit_power_law(self):
+        xs = [10, 20, 40, 80]
+        a, b = fit_power_law(xs, [3 * x**2 for x in xs])
+        self.assertAlmostEqual(3, a)
+        self.assertAlmostEqual(2, b)
@@ -0,0 +1,26 @@
+import tempfile
+import unittest
+
+from benchmark import Backend
+from generators import chain
+from incremental import run_incremental, split_batches
+
+
+class TestIncremental(unittest.TestCase):
+
+    def test_split_batches(self):
+        edges = chain(20)
+        base, batches = split_batches(edges, 3, 2, 0)
+        self.assertEqual([3, 3], [len(batch) for batch in batches])
+        held_out = [edge for batch in batches for edge in batch]
+        self.assertEqual(sorted(edges), sorted(base + held_out))
+        self.assertEqual((base, batches), split_batches(edges, 3, 2, 0))
+
+    def test_incremental_matches_recompute(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            result = run_incremental(Backend("sqlite", tmp), chain(12), 2, 2, 1, 0)
+        self.assertTrue(result["consistent"])
+        self.assertEqual(2, len(result["batches"]))
+        self.assertEqual(7, result["base_facts"])
+        # Every pair of nodes along the chain
+        self.assertEqual(12 * 11 // 2, result["derived_facts"])
@@ -0,0 +1,124 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+from datalog import Program, Rule
+from plan_cache import PlanCache, compile_program, fingerprint
+
+
+def transitive_closure(constant=1) -> list[Rule]:
+    return [
+        Rule.create("T", ["?x", "?y"], [("E", ["?x", "?y"])]),
+        Rule.create(
+            "T",
+            ["?x", "?z"],
+            [("T", ["?x", "?y"]), ("E", ["?y", "?z"]), ("F", ["?z", constant])],
+        ),
+    ]
+
+
+class TestPlanCache(unittest.TestCase):
+    def test_fingerprint(self):
+        program = Program(transitive_closure())
+        key = fingerprint(program, "sqlite")
+        self.assertEqual(
+            key, fingerprint(Program(list(reversed(transitive_closure()))), "sqlite")
+        )
+        self.assertNotEqual(key, fingerprint(program, "duckdb"))
+        # Constants of different types are different programs
+        for constant in ["1", True]:
+            other = Program(transitive_closure(constant))
+            self.assertNotEqual(key, fingerprint(other, "sqlite"))
+
+    def test_load_and_store(self):
+        program = Program(transitive_closure())
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PlanCache(directory)
+            compiled = cache.get(program, "sqlite")
+            self.assertEqual((cache.hits, cache.misses), (0, 1))
+            self.assertEqual(compiled, cache.get(program, "sqlite"))
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            self.assertEqual(compiled, compile_program(program))
+
+            # A damaged file is a miss and gets rewritten
+            key = fingerprint(program, "sqlite")
+            with open(os.path.join(directory, f"{key}.pickle"), "wb") as file:
+                file.write(b"\x80")
+            self.assertEqual(compiled, cache.get(program, "sqlite"))
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+            self.assertEqual(compiled, cache.get(program, "sqlite"))
+
+    def test_load_incompatible(self):
+        # Pickles of renamed classes and modules, or of a newer protocol, are misses
+        program = Program(transitive_closure())
+        data = pickle.dumps(compile_program(program), pickle.HIGHEST_PROTOCOL)
+        with tempfile.TemporaryDirectory() as directory:
+            cache = PlanCache(directory)
+            key = fingerprint(program, "sqlite")
+            for damaged in [
+                data.replace(b"CompiledProgram", b"CompiledProgrem"),
+                data.replace(b"plan_cache", b"plan_cachf"),
+                b"\x80\x09" + data[2:],
+            ]:
+                with open(cache.path(key), "wb") as file:
+                    file.write(damaged)
+                self.assertIsNone(cache.load(key))
+            self.assertEqual((cache.hits, cache.misses), (0, 3))
+            # The miss recompiles and replaces the file
+            cache.get(program, "sqlite")
+            self.assertIsNotNone(cache.load(key))
+
+    def test_hoist_invariant_ops(self):
+        # Selections on E and their join read nothing that changes in the
+        # recursive iterations, the join with the delta of T does
+        program = Program(
+            [
+                Rule.create("T", ["?x", "?y"], [("E", ["?x", 0, "?y"])]),
+                Rule.create(
+                    "T",
+                    ["?w", "?x"],
+                    [
+                        ("E", ["?x", 2, "?y"]),
+                        ("E", ["?y", 0, "?z"]),
+                        ("T", ["?w", "?z"]),
+                    ],
+                ),
+            ]
+        )
+        compiled = compile_program(program)
+        [rule] = compiled.recursive
+        ops = [op for op in compiled.rule_plans[rule].ops if op.table]
+        self.assertEqual(
+            [True, True, True, False], [op.hoisted for op in ops]
+        )
+        self.assertEqual(["E_0", "E_1", "E_2"], ops[1].indexes[0])
+        self.assertEqual("E_1eq0_2_alias", ops[2].indexes[0][0])
+        for plan in compiled.rule_plans.values():
+            if plan.rule not in compiled.recursive:
+                self.assertFalse(any(op.hoisted for op in plan.ops))
+
+    def test_selection_partitions(self):
+        # Selections of T and OLD_T are kept and appended, those of the delta
+        # are not
+        program = Program(
+            [
+                Rule.create("T", ["?x", 2, "?y"], [("E", ["?x", "?y"])]),
+                Rule.create(
+                    "T",
+                    ["?x", 2, "?z"],
+                    [("T", ["?x", 2, "?y"]), ("T", ["?y", 2, "?z"])],
+                ),
+            ]
+        )
+        compiled = compile_program(program)
+        partitions = {
+            op.table: (op.inputs[0][0], op.where)
+            for rule in compiled.recursive
+            for op in compiled.rule_plans[rule].ops
+            if op.partition
+        }
+        self.assertEqual(
+            {"T_1eq2": ("T", "T_1 = 2"), "OLD_T_1eq2": ("OLD_T", "T_1 = 2")},
+            partitions,
+        )
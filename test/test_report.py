@@ -0,0 +1,52 @@
+import json
+import os
+import tempfile
+import unittest
+
+from report import load_records, rank, regressions, rule_costs, time_by_tag
+
+RULE = "dT(?x, ?z) :- T(?x, ?y), dE(?y, ?z)"
+RECORDS = [
+    (1, 0, "SPJ_JOIN", 3000, RULE, 0, 0),
+    (1, 0, "SPJ_PROJECT", 1000, RULE, 4, 0),
+    (1, 0, "SPJ_PROJECT", 500, "dT(?x) :- dE(?x)", 5, 0),
+    (1, 1, "SPJ_PROJECT", 1000, RULE, 0, 0),
+    (1, 1, "FACT_COUNT", 200, "", -1, 1),
+]
+
+
+class TestReport(unittest.TestCase):
+
+    def test_rule_costs(self):
+        costs = rule_costs(RECORDS)
+        cost = costs[RULE]
+        self.assertEqual(5000, cost.total_ns)
+        self.assertEqual(4, cost.derivations)
+        self.assertEqual(1250, cost.ns_per_derivation)
+        self.assertEqual({"SPJ_JOIN": 3000, "SPJ_PROJECT": 2000}, dict(cost.by_tag))
+        self.assertEqual({0: 4000, 1: 1000}, dict(cost.by_iter))
+        self.assertEqual([RULE, "dT(?x) :- dE(?x)", ""], [c.rule for c in rank(costs)])
+        self.assertEqual("dT(?x) :- dE(?x)", rank(costs, "derivations")[0].rule)
+        self.assertEqual("SPJ_JOIN", next(iter(time_by_tag(costs))))
+
+    def test_runs_are_averaged(self):
+        second = [(2, *record[1:]) for record in RECORDS]
+        costs = rule_costs(RECORDS + second)
+        self.assertEqual(5000, costs[RULE].total_ns)
+
+    def test_regressions(self):
+        old = rule_costs(RECORDS)
+        slower = [
+            (test_run, iter, tag, ns * 2 if rule == RULE else ns, rule, a, r)
+            for test_run, iter, tag, ns, rule, a, r in RECORDS
+        ]
+        new = rule_costs(slower)
+        self.assertEqual([(RULE, 5000, 10000, 2.0)], regressions(old, new))
+        self.assertEqual([], regressions(new, old))
+
+    def test_load_records(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "dense.json")
+            with open(path, "w") as f:
+                json.dump([RECORDS, RECORDS], f)
+            self.assertEqual(RECORDS + RECORDS, load_records(path))
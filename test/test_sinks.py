@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from sinks import CsvSink, JsonlSink, MemorySink, SqliteSink, StatementSink
+
+RECORDS = [
+    (1, 0, "SPJ_SELECT", 1200, "dT(?x) :- dE(?x)", 3, 0),
+    (1, 0, "SPJ_PROJECT", 5400, "dT(?x) :- dE(?x)", 3, 0),
+    (1, 1, "FACT_COUNT", 800, "", -1, 1),
+    (1, 1, "SPJ_SELECT", 1100, "dT(?x) :- dE(?x)", 0, 0),
+]
+
+
+class TestSinks(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def write(self, sink: StatementSink):
+        for record in RECORDS:
+            sink.write(record)
+
+    def test_abstract_sink(self):
+        with self.assertRaises(TypeError):
+            StatementSink()
+
+    def test_memory_sink(self):
+        sink = MemorySink()
+        self.write(sink)
+        self.assertEqual(RECORDS, sink.records())
+        # Rules and tags are stored once and referenced by id
+        self.assertEqual(["dT(?x) :- dE(?x)", ""], sink.rules.values)
+        self.assertEqual(["SPJ_SELECT", "SPJ_PROJECT", "FACT_COUNT"], sink.tags.values)
+
+    def test_memory_sink_cap(self):
+        sink = MemorySink(max_records=2)
+        self.write(sink)
+        self.assertEqual(RECORDS[2:], sink.records())
+
+    def test_file_sinks(self):
+        for sink in [
+            JsonlSink(os.path.join(self.tmp.name, "statements.jsonl"), buffer_size=2),
+            CsvSink(os.path.join(self.tmp.name, "statements.csv"), buffer_size=2),
+            SqliteSink(os.path.join(self.tmp.name, "statements.db"), buffer_size=2),
+        ]:
+            self.write(sink)
+            self.assertEqual(RECORDS, sink.records())
+            sink.close()
+            self.assertEqual(RECORDS, sink.records())
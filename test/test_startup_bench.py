@@ -0,0 +1,13 @@
+import unittest
+
+from startup_bench import measure_import
+
+
+class TestStartupBench(unittest.TestCase):
+    def test_no_heavy_imports(self):
+        # Timing is left to the benchmark, only what gets loaded is checked
+        for module in ["compiler", "plan_cache", "report", "datalog_parser"]:
+            import_ns, process_ns, loaded = measure_import(module)
+            self.assertEqual([], loaded, module)
+            self.assertLess(0, import_ns)
+            self.assertLess(import_ns, process_ns)
@@ -0,0 +1,55 @@
+import unittest
+
+from tracing import Tracer
+
+
+class TestTracing(unittest.TestCase):
+
+    def trace(self, tracer: Tracer):
+        with tracer.span("poll"):
+            with tracer.span("iteration", iter=0):
+                with tracer.span("rule", rule="T(?x) :- E(?x)"):
+                    pass
+            with tracer.span("iteration", iter=1):
+                pass
+
+    def test_disabled(self):
+        tracer = Tracer()
+        self.trace(tracer)
+        self.assertEqual([], tracer.spans)
+
+    def test_nested_spans(self):
+        tracer = Tracer(True)
+        self.trace(tracer)
+        parents = [(span.name, span.span_id, span.parent_id) for span in tracer.spans]
+        self.assertEqual(
+            [("poll", 1, 0), ("iteration", 2, 1), ("rule", 3, 2), ("iteration", 4, 1)],
+            parents,
+        )
+        for span in tracer.spans:
+            self.assertLessEqual(span.start_ns, span.end_ns)
+
+    def test_chrome_trace(self):
+        tracer = Tracer(True)
+        self.trace(tracer)
+        events = tracer.chrome_trace()["traceEvents"]
+        names = [event["name"] for event in events]
+        self.assertEqual(["poll", "iteration", "rule", "iteration"], names)
+        poll, _, rule, _ = events
+        self.assertEqual("X", poll["ph"])
+        self.assertGreaterEqual(rule["ts"], poll["ts"])
+        self.assertLessEqual(rule["ts"] + rule["dur"], poll["ts"] + poll["dur"])
+        self.assertEqual({"rule": "T(?x) :- E(?x)"}, rule["args"])
+
+    def test_otlp_trace(self):
+        tracer = Tracer(True)
+        self.trace(tracer)
+        [resource_spans] = tracer.otlp_trace()["resourceSpans"]
+        [scope_spans] = resource_spans["scopeSpans"]
+        poll, iteration, _, _ = scope_spans["spans"]
+        self.assertNotIn("parentSpanId", poll)
+        self.assertEqual(poll["spanId"], iteration["parentSpanId"])
+        self.assertEqual(32, len(poll["traceId"]))
+        self.assertEqual(
+            [{"key": "iter", "value": {"intValue": "0"}}], iteration["attributes"]
+        )
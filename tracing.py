@@ -0,0 +1,117 @@
+import json
+import os
+import time
+from contextlib import nullcontext
+from typing import Any
+
+# Shared no-op context returned while tracing is disabled
+NULL_SPAN = nullcontext()
+
+
+class Span:
+    def __init__(
+        self, tracer: "Tracer", span_id: int, name: str, attributes: dict[str, Any]
+    ) -> None:
+        self.tracer = tracer
+        self.span_id = span_id
+        self.parent_id = 0
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = 0
+        self.end_ns = 0
+
+    def __enter__(self) -> "Span":
+        stack = self.tracer.stack
+        if stack:
+            self.parent_id = stack[-1].span_id
+        stack.append(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> bool:
+        self.end_ns = time.perf_counter_ns()
+        self.tracer.stack.pop()
+        return False
+
+
+class Tracer:
+    def __init__(self, enabled: bool = False, service_name: str = "pyterry") -> None:
+        self.enabled = enabled
+        self.service_name = service_name
+        self.spans: list[Span] = []
+        self.stack: list[Span] = []
+        self.trace_id = os.urandom(16).hex()
+        # Spans are timed with perf_counter_ns and shifted to wall clock on export
+        self.epoch_ns = time.time_ns() - time.perf_counter_ns()
+
+    def span(self, name: str, **attributes: Any) -> Span | nullcontext:
+        if not self.enabled:
+            return NULL_SPAN
+        span = Span(self, len(self.spans) + 1, name, attributes)
+        self.spans.append(span)
+        return span
+
+    def chrome_trace(self) -> dict[str, Any]:
+        pid = os.getpid()
+        events: list[dict[str, Any]] = []
+        for span in self.spans:
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.name,
+                    "ph": "X",
+                    "ts": (self.epoch_ns + span.start_ns) / 1000,
+                    "dur": (span.end_ns - span.start_ns) / 1000,
+                    "pid": pid,
+                    "tid": 1,
+                    "args": {key: str(value) for key, value in span.attributes.items()},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def otlp_trace(self) -> dict[str, Any]:
+        spans: list[dict[str, Any]] = []
+        for span in self.spans:
+            otlp_span: dict[str, Any] = {
+                "traceId": self.trace_id,
+                "spanId": f"{span.span_id:016x}",
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(self.epoch_ns + span.start_ns),
+                "endTimeUnixNano": str(self.epoch_ns + span.end_ns),
+                "attributes": [
+                    otlp_attribute(key, value)
+                    for key, value in span.attributes.items()
+                ],
+            }
+            if span.parent_id:
+                otlp_span["parentSpanId"] = f"{span.parent_id:016x}"
+            spans.append(otlp_span)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": [
+                            otlp_attribute("service.name", self.service_name)
+                        ]
+                    },
+                    "scopeSpans": [{"scope": {"name": "pyterry"}, "spans": spans}],
+                }
+            ]
+        }
+
+    def export_chrome(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def export_otlp(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.otlp_trace(), f)
+
+
+def otlp_attribute(key: str, value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    return {"key": key, "value": {"stringValue": str(value)}}